@@ -0,0 +1,123 @@
+"""Bytes transferred and decoded per query by each retrieval path, with the full payload vs the projected fields.
+
+Requests go to the Qdrant REST API directly so the response bodies can be measured:
+
+    python -m apps.api.evals.eval_payload_projection --query "wireless earbuds for the gym" --repeats 20
+"""
+import argparse
+import json
+import statistics
+import time
+
+import httpx
+from qdrant_client.models import FieldCondition, Filter, MatchAny, QueryRequest, ScrollRequest
+
+from api.agents.utils.embeddings import get_embedding_service
+from api.agents.utils.hydration import REFERENCE_PAYLOAD_FIELDS
+from api.agents.utils.vector_search import ITEMS_SEARCH, REVIEWS_SEARCH
+from api.core.config import config
+
+
+DEFAULT_QUERIES = [
+    "wireless earbuds for the gym",
+    "a tablet with long battery life",
+    "usb-c charger for a laptop",
+    "noise cancelling headphones under 100 dollars"
+]
+
+
+def query_request(search, query, embedding, k, with_payload, query_filter=None):
+    """The REST body of search.query_points(...), with with_payload overridden."""
+
+    args = search.query_args(query, embedding, k, query_filter=query_filter)
+    collection_name = args.pop("collection_name")
+    args["filter"] = args.pop("query_filter", None)
+    args["params"] = args.pop("search_params", None)
+    args["with_vector"] = args.pop("with_vectors")
+    args["with_payload"] = with_payload
+
+    return f"/collections/{collection_name}/points/query", QueryRequest(**args)
+
+
+def scroll_request(item_ids, with_payload):
+    return f"/collections/{config.QDRANT_ITEMS_COLLECTION}/points/scroll", ScrollRequest(
+        filter=Filter(must=[FieldCondition(key="parent_asin", match=MatchAny(any=item_ids))]),
+        limit=len(item_ids),
+        with_payload=with_payload,
+        with_vector=False
+    )
+
+
+def measure(http_client, path, request, repeats):
+    body = request.model_dump(mode="json", exclude_none=True)
+    sizes, decode_us, round_trip_ms = [], [], []
+
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = http_client.post(path, json=body)
+        response.raise_for_status()
+        round_trip_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        json.loads(response.content)
+        decode_us.append((time.perf_counter() - started) * 1_000_000)
+        sizes.append(len(response.content))
+
+    return {"bytes": statistics.mean(sizes), "decode_us": statistics.median(decode_us), "round_trip_ms": statistics.median(round_trip_ms)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--query", action="append", help="Repeatable; defaults to a few sample questions")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    queries = args.query or DEFAULT_QUERIES
+    paths = {}
+
+    with httpx.Client(base_url=config.QDRANT_URL, timeout=config.QDRANT_TIMEOUT) as http_client:
+        for query in queries:
+            embedding = get_embedding_service().get_embedding(query)
+
+            # The reviews and hydration paths are measured for the items this query retrieves
+            path, request = query_request(ITEMS_SEARCH, query, embedding, args.k, ["parent_asin"])
+            response = http_client.post(path, json=request.model_dump(mode="json", exclude_none=True))
+            item_ids = [point["payload"]["parent_asin"] for point in response.raise_for_status().json()["result"]["points"]]
+            reviews_filter = Filter(must=[FieldCondition(key="parent_asin", match=MatchAny(any=item_ids))])
+
+            variants = {
+                "items retrieval": (
+                    query_request(ITEMS_SEARCH, query, embedding, args.k, True),
+                    query_request(ITEMS_SEARCH, query, embedding, args.k, ITEMS_SEARCH.payload_fields())
+                ),
+                "reviews retrieval": (
+                    query_request(REVIEWS_SEARCH, query, embedding, args.k, True, reviews_filter),
+                    query_request(REVIEWS_SEARCH, query, embedding, args.k, REVIEWS_SEARCH.payload_fields(), reviews_filter)
+                ),
+                "reference hydration": (
+                    scroll_request(item_ids, True),
+                    scroll_request(item_ids, REFERENCE_PAYLOAD_FIELDS)
+                )
+            }
+
+            for name, (full, projected) in variants.items():
+                paths.setdefault(name, {"full": [], "projected": []})
+                paths[name]["full"].append(measure(http_client, *full, args.repeats))
+                paths[name]["projected"].append(measure(http_client, *projected, args.repeats))
+
+    print(f"{len(queries)} queries, k={args.k}, {args.repeats} repeats each; per query means of medians\n")
+    print("| path | payload | bytes | JSON decode (µs) | round trip (ms) |")
+    print("|---|---|---|---|---|")
+
+    for name, variants in paths.items():
+        for variant, runs in variants.items():
+            print(
+                f"| {name} | {variant} | {statistics.mean(run['bytes'] for run in runs):,.0f} "
+                f"| {statistics.mean(run['decode_us'] for run in runs):.0f} "
+                f"| {statistics.mean(run['round_trip_ms'] for run in runs):.2f} |"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Recall vs latency of the items retriever across collection variants (dimensions, quantization, rescoring).
+
+Build each variant first, e.g.
+
+    python -m api.ingest items $ITEMS_FILE --collection items-256-binary --dimensions 256 --quantization binary
+
+then compare them on the retriever evaluation dataset:
+
+    python -m apps.api.evals.eval_quantization \
+        --variant "full:collection=Amazon-items-collection-01-hybrid-search-v2" \
+        --variant "256-binary:collection=items-256-binary,dimensions=256,oversampling=3.0" \
+        --variant "256-binary-norescore:collection=items-256-binary,dimensions=256,rescore=false"
+"""
+from types import SimpleNamespace
+import argparse
+import statistics
+import time
+
+from api.agents.retrieval_generation import retrieve_data
+from api.agents.utils.embeddings import get_embedding_service
+from api.agents.utils.vector_search import dense_search_params
+from api.core.config import config
+
+from apps.api.evals.eval_retriever import (
+    ls_client,
+    qdrant_client,
+    ragas_context_precision_id_based,
+    ragas_context_recall_id_based
+)
+
+
+BYTES_PER_DIMENSION = {"none": 4, "scalar": 1, "binary": 1 / 8}
+
+
+def parse_variant(spec: str) -> dict:
+    name, _, options = spec.partition(":")
+    variant = {"name": name, "collection": None, "dimensions": 0, "oversampling": None, "rescore": None}
+
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key == "collection":
+            variant[key] = value
+        elif key == "dimensions":
+            variant[key] = int(value)
+        elif key == "oversampling":
+            variant[key] = float(value)
+        elif key == "rescore":
+            variant[key] = value.lower() in ("1", "true", "yes")
+        else:
+            raise ValueError(f"Unknown variant option {key!r}")
+
+    return variant
+
+
+def collection_footprint(collection_name) -> dict:
+    info = qdrant_client.get_collection(collection_name)
+    vectors = info.config.params.vectors
+    size = vectors["text-embedding-3-small"].size if isinstance(vectors, dict) else vectors.size
+
+    quantization = "none"
+    if info.config.quantization_config is not None:
+        quantization = "scalar" if getattr(info.config.quantization_config, "scalar", None) else "binary"
+
+    points = info.points_count or 0
+
+    return {
+        "size": size,
+        "quantization": quantization,
+        "points": points,
+        "ram_mb": points * size * BYTES_PER_DIMENSION[quantization] / 2 ** 20
+    }
+
+
+def evaluate_variant(variant, examples, k):
+    search_params = dense_search_params(variant["oversampling"], variant["rescore"])
+
+    # Embed every question up front so the timings cover the Qdrant query only
+    for example in examples:
+        get_embedding_service().get_embedding(example.inputs["question"], dimensions=variant["dimensions"])
+
+    latencies, recalls, precisions = [], [], []
+
+    for example in examples:
+        started = time.perf_counter()
+        context = retrieve_data(
+            example.inputs["question"],
+            qdrant_client,
+            k,
+            collection_name=variant["collection"],
+            dimensions=variant["dimensions"],
+            search_params=search_params
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        run = SimpleNamespace(outputs=context)
+        recall = ragas_context_recall_id_based(run, example)
+        precision = ragas_context_precision_id_based(run, example)
+        if recall is not None:
+            recalls.append(recall)
+        if precision is not None:
+            precisions.append(precision)
+
+    return {
+        "recall": statistics.mean(recalls) if recalls else float("nan"),
+        "precision": statistics.mean(precisions) if precisions else float("nan"),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variant", action="append", required=True, help="name:collection=...,dimensions=...,oversampling=...,rescore=...")
+    parser.add_argument("--dataset", default="rag-evaluation-dataset-v3")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    examples = list(ls_client.list_examples(dataset_name=args.dataset))
+
+    print(f"{len(examples)} questions, k={args.k}\n")
+    print("| variant | dims | quantization | oversampling | rescore | vector RAM (MB) | recall | precision | p50 (ms) | p95 (ms) |")
+    print("|---|---|---|---|---|---|---|---|---|---|")
+
+    for spec in args.variant:
+        variant = parse_variant(spec)
+        footprint = collection_footprint(variant["collection"] or config.QDRANT_ITEMS_COLLECTION)
+        scores = evaluate_variant(variant, examples, args.k)
+        params = dense_search_params(variant["oversampling"], variant["rescore"]).quantization
+
+        print(
+            f"| {variant['name']} | {footprint['size']} | {footprint['quantization']} | {params.oversampling} | {params.rescore} "
+            f"| {footprint['ram_mb']:.1f} | {scores['recall']:.3f} | {scores['precision']:.3f} "
+            f"| {scores['p50_ms']:.1f} | {scores['p95_ms']:.1f} |"
+        )
+
+
+if __name__ == "__main__":
+    main()
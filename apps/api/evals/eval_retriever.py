@@ -1,4 +1,20 @@
-import openai
+"""Retrieval and answer quality on the LangSmith evaluation dataset, scored with ragas.
+
+Everything runs on one event loop. The four metrics of an example are scored concurrently, and
+at most --judge-concurrency LLM judge calls are in flight. Pipeline outputs and judge scores are
+cached in SQLite (--cache-path), keyed by the question and a hash of everything else that
+determines them, so a re-run only pays for what changed:
+
+    python -m apps.api.evals.eval_retriever                    # full pipeline, all metrics
+    python -m apps.api.evals.eval_retriever --retriever-only   # retrieval and the ID-based metrics only
+
+Set EMBEDDING_CACHE_BACKEND=sqlite to also keep the query embeddings across runs.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sqlite3
 
 from langsmith import Client
 from qdrant_client import QdrantClient
@@ -12,114 +28,248 @@ from ragas.embeddings import LangchainEmbeddingsWrapper
 from ragas.dataset_schema import SingleTurnSample
 from ragas.metrics import IDBasedContextPrecision, IDBasedContextRecall, Faithfulness, ResponseRelevancy
 
-import asyncio
-
-from api.agents.retrieval_generation import rag_pipeline
+from api.agents.retrieval_generation import rag_pipeline, retrieve_data
+from api.agents.utils.prompt_management import PROMPTS_DIR
+from api.core.config import config
 
 ls_client = Client()
 qdrant_client = QdrantClient(
     url="http://localhost:6333"
 )
 
-ragas_llm = LangchainLLMWrapper(ChatOpenAI(model="gpt-4.1-mini"))
-ragas_embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings(model="text-embedding-3-small"))
+JUDGE_MODEL = "gpt-4.1-mini"
+JUDGE_EMBEDDING_MODEL = "text-embedding-3-small"
 
-def _skip_metric(key: str, reason: str):
-    return {
-        "key": key,
-        "value": "skipped",
-        "metadata": {"reason": reason},
+ragas_llm = LangchainLLMWrapper(ChatOpenAI(model=JUDGE_MODEL))
+ragas_embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings(model=JUDGE_EMBEDDING_MODEL))
+
+# Built once and shared by every example
+faithfulness_scorer = Faithfulness(llm=ragas_llm)
+response_relevancy_scorer = ResponseRelevancy(llm=ragas_llm, embeddings=ragas_embeddings)
+context_precision_scorer = IDBasedContextPrecision()
+context_recall_scorer = IDBasedContextRecall()
+
+
+#### DISK CACHE ####
+def config_hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def collection_generation(collection_name: str) -> str:
+    """The ingest generation of a collection (or of the one its alias points to), so a re-ingest changes the hash."""
+
+    for description in qdrant_client.get_aliases().aliases:
+        if description.alias_name == collection_name:
+            collection_name = description.collection_name
+            break
+
+    info = qdrant_client.get_collection(collection_name)
+    generation = (info.config.metadata or {}).get("ingest_generation")
+
+    return f"{collection_name}:{generation or info.points_count}"
+
+
+def pipeline_settings(k: int, retriever_only: bool) -> dict:
+    """What the pipeline's output depends on besides the question; secrets and endpoints are left out."""
+
+    settings = {
+        "k": k,
+        "items_generation": collection_generation(config.QDRANT_ITEMS_COLLECTION),
+        **{
+            key: value for key, value in config.model_dump().items()
+            if key.startswith(("QDRANT_ITEMS_", "QDRANT_QUANTIZATION_", "RETRIEVAL_", "EMBEDDING_DIMENSIONS"))
+        }
     }
 
+    if not retriever_only:
+        settings["prompts"] = {path.name: path.read_text() for path in sorted(PROMPTS_DIR.glob("*.yaml"))}
 
-def ragas_faithfulness(run, example):
-    question = run.outputs.get("question")
-    answer = run.outputs.get("answer")
-    contexts = run.outputs.get("retrieved_context")
-    if not question or not answer or not contexts:
-        return _skip_metric(
-            "ragas_faithfulness", "missing question/answer/retrieved_context"
+    return settings
+
+
+class EvalCache:
+    """JSON values in a SQLite file, keyed by (kind, question, config hash)."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(kind TEXT NOT NULL, question TEXT NOT NULL, config_hash TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (kind, question, config_hash))"
         )
+        self.hits = 0
+        self.misses = 0
 
-    sample = SingleTurnSample(
-        user_input=question,
-        response=answer,
-        retrieved_contexts=contexts,
-    )
+    def get(self, kind: str, question: str, key: str):
+        row = self._conn.execute(
+            "SELECT value FROM results WHERE kind = ? AND question = ? AND config_hash = ?", (kind, question, key)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, kind: str, question: str, key: str, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO results (kind, question, config_hash, value) VALUES (?, ?, ?, ?)",
+            (kind, question, key, json.dumps(value))
+        )
+
+    def close(self):
+        self._conn.close()
+
+
+#### TARGET ####
+def cached_target(cache: EvalCache, k: int, retriever_only: bool):
+    kind = "retrieval" if retriever_only else "pipeline"
+    key = config_hash(pipeline_settings(k, retriever_only))
+
+    async def target(inputs: dict) -> dict:
+        question = inputs["question"]
+
+        outputs = cache.get(kind, question, key)
+        if outputs is None:
+            # The pipeline is sync; run it off the loop so examples overlap
+            if retriever_only:
+                outputs = {"question": question, **await asyncio.to_thread(retrieve_data, question, qdrant_client, k)}
+            else:
+                result = await asyncio.to_thread(rag_pipeline, question, qdrant_client, k)
+                outputs = {
+                    **result,
+                    "original_output": result["original_output"].model_dump(),
+                    "reference": [reference.model_dump() for reference in result["reference"]]
+                }
+            cache.set(kind, question, key, outputs)
 
-    async def inner():
-        return await Faithfulness(llm=ragas_llm).single_turn_ascore(sample)
+        return outputs
 
-    return asyncio.run(inner())
+    return target
 
 
-def ragas_response_relevancy(run, example):
+#### METRICS ####
+def _skip_metric(key: str, reason: str):
+    return {
+        "key": key,
+        "value": "skipped",
+        "metadata": {"reason": reason},
+    }
+
+
+def judged_sample(run):
     question = run.outputs.get("question")
     answer = run.outputs.get("answer")
     contexts = run.outputs.get("retrieved_context")
     if not question or not answer or not contexts:
-        return _skip_metric(
-            "ragas_response_relevancy", "missing question/answer/retrieved_context"
-        )
+        return None
 
-    sample = SingleTurnSample(
+    return SingleTurnSample(
         user_input=question,
         response=answer,
         retrieved_contexts=contexts,
     )
 
-    async def inner():
-        scorer = ResponseRelevancy(llm=ragas_llm, embeddings=ragas_embeddings)
-        return await scorer.single_turn_ascore(sample)
-
-    return asyncio.run(inner())
 
-
-def ragas_context_precision_id_based(run, example):
+def id_based_sample(run, example):
     retrieved_ids = run.outputs.get("retrieved_context_ids")
     reference_ids = example.outputs.get("reference_context_ids")
     if not retrieved_ids or not reference_ids:
         return None
 
-    sample = SingleTurnSample(
+    return SingleTurnSample(
         retrieved_context_ids=retrieved_ids,
         reference_context_ids=reference_ids
     )
 
-    async def inner():
-        scorer = IDBasedContextPrecision()
-        return await scorer.single_turn_ascore(sample)
 
-    return asyncio.run(inner())
+def ragas_context_precision_id_based(run, example):
+    """Sync form for scripts without an event loop (eval_quantization)."""
+
+    sample = id_based_sample(run, example)
+    return asyncio.run(context_precision_scorer.single_turn_ascore(sample)) if sample else None
 
 
 def ragas_context_recall_id_based(run, example):
-    retrieved_ids = run.outputs.get("retrieved_context_ids")
-    reference_ids = example.outputs.get("reference_context_ids")
-    if not retrieved_ids or not reference_ids:
-        return None
+    """Sync form for scripts without an event loop (eval_quantization)."""
+
+    sample = id_based_sample(run, example)
+    return asyncio.run(context_recall_scorer.single_turn_ascore(sample)) if sample else None
+
+
+def ragas_evaluator(cache: EvalCache, semaphore: asyncio.Semaphore, judged: bool = True):
+    """One evaluator per example that scores its metrics concurrently; LLM judge scores are cached."""
+
+    async def _judge(key, scorer, run):
+        sample = judged_sample(run)
+        if sample is None:
+            return _skip_metric(key, "missing question/answer/retrieved_context")
+
+        sample_hash = config_hash(JUDGE_MODEL, JUDGE_EMBEDDING_MODEL, sample.response, sample.retrieved_contexts)
+
+        score = cache.get(key, sample.user_input, sample_hash)
+        if score is None:
+            async with semaphore:
+                score = await scorer.single_turn_ascore(sample)
+            cache.set(key, sample.user_input, sample_hash, score)
+
+        return {"key": key, "score": score}
+
+    async def _id_based(key, scorer, run, example):
+        sample = id_based_sample(run, example)
+        if sample is None:
+            return None
+
+        return {"key": key, "score": await scorer.single_turn_ascore(sample)}
+
+    async def _safely(key, coro):
+        try:
+            return await coro
+        except Exception as e:
+            return {"key": key, "value": "error", "metadata": {"reason": repr(e)}}
+
+    async def ragas_metrics(run, example):
+        metrics = {
+            "ragas_context_precision_id_based": _id_based("ragas_context_precision_id_based", context_precision_scorer, run, example),
+            "ragas_context_recall_id_based": _id_based("ragas_context_recall_id_based", context_recall_scorer, run, example),
+        }
+        if judged:
+            metrics["ragas_faithfulness"] = _judge("ragas_faithfulness", faithfulness_scorer, run)
+            metrics["ragas_response_relevancy"] = _judge("ragas_response_relevancy", response_relevancy_scorer, run)
+
+        results = await asyncio.gather(*[_safely(key, coro) for key, coro in metrics.items()])
+
+        return {"results": [result for result in results if result is not None]}
+
+    return ragas_metrics
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default="rag-evaluation-dataset-v3")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--retriever-only", action="store_true", help="skip generation and the LLM judges")
+    parser.add_argument("--max-concurrency", type=int, default=10, help="examples in flight")
+    parser.add_argument("--judge-concurrency", type=int, default=8, help="LLM judge calls in flight")
+    parser.add_argument("--cache-path", default="eval_cache.sqlite3")
+    args = parser.parse_args()
+
+    cache = EvalCache(args.cache_path)
+
+    try:
+        await ls_client.aevaluate(
+            cached_target(cache, args.k, args.retriever_only),
+            data=args.dataset,
+            evaluators=[ragas_evaluator(cache, asyncio.Semaphore(args.judge_concurrency), judged=not args.retriever_only)],
+            experiment_prefix="retriever-only" if args.retriever_only else "retriever",
+            metadata={"k": args.k, "config_hash": config_hash(pipeline_settings(args.k, args.retriever_only))},
+            max_concurrency=args.max_concurrency
+        )
+    finally:
+        print(f"Eval cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
 
-    sample = SingleTurnSample(
-        retrieved_context_ids=retrieved_ids,
-        reference_context_ids=reference_ids
-    )
 
-    async def inner():
-        scorer = IDBasedContextRecall()
-        return await scorer.single_turn_ascore(sample)
-
-    return asyncio.run(inner())
-
-
-results = ls_client.evaluate(
-    lambda x: rag_pipeline(x["question"], qdrant_client),
-    data="rag-evaluation-dataset-v3",
-    evaluators=[
-        ragas_faithfulness,
-        ragas_response_relevancy,
-        ragas_context_precision_id_based,
-        ragas_context_recall_id_based
-    ],
-    experiment_prefix="retriever",
-    max_concurrency=10
-)
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,16 +1,25 @@
-from openai import OpenAI
-
 from langsmith import traceable, get_current_run_tree
-from langchain_core.messages import convert_to_openai_messages
+from langgraph.types import StreamWriter
 import instructor
-
-from api.agents.utils.prompt_management import prompt_template_config
+import asyncio
+import logging
+import time
+
+from api.agents.utils.history import history_messages, message_tokens, router_messages, turns_to_fold, without_tool_output
+from api.agents.utils.intent import catalog_similarity
+from api.agents.tools import get_available_tools
+from api.agents.utils.prompt_management import get_prompt_template
 from api.agents.utils.utils import format_ai_message
+from api.core.clients import get_async_openai_client
+from api.core.config import config
 
 from pydantic import BaseModel, Field, AliasChoices
 from typing import List
 
 
+logger = logging.getLogger(__name__)
+
+
 ### Intent Router Response Model
 class IntentRouterResponse(BaseModel):
     question_relevant: bool
@@ -27,53 +36,126 @@ class RAGUsedContext(BaseModel):
     description: str = Field(description="Short description of the item used to answer the question")
 
 class AgentResponse(BaseModel):
-    answer: str = Field(description="The answer to the question")
-    references: List[RAGUsedContext] = Field(description="The list of the items used to answer the question")
+    # Field order is the generation order: tool calls and references are settled before the answer
+    # starts, so the answer can be streamed and the references hydrated while it is written.
     final_answer: bool = False
     tool_calls: List[ToolCall] = []
+    references: List[RAGUsedContext] = Field(description="The list of the items used to answer the question")
+    answer: str = Field(description="The answer to the question")
 
 ### QnA Agent Node
-@traceable(
-    name="agent_node",
-    run_type="llm",
-    metadata={"ls_provider": "openai", "ls_model_name": "gpt-4o-mini"}
-)
-def agent_node(state) -> dict:
 
-    template = prompt_template_config("api/agents/prompts/qa_agent.yaml", "qa_agent")
+def _streaming_instructor_client(usage: list):
+    """Instructor client whose streamed completions also collect the token usage chunk into `usage`."""
 
-    prompt = template.render(
-        available_tools=state.available_tools
+    openai_client = get_async_openai_client()
+
+    async def _create(*args, **kwargs):
+        stream = await openai_client.chat.completions.create(*args, stream_options={"include_usage": True}, **kwargs)
+
+        async def _chunks():
+            async for chunk in stream:
+                if chunk.usage:
+                    usage.append(chunk.usage)
+                yield chunk
+
+        return _chunks()
+
+    return instructor.AsyncInstructor(
+        client=openai_client,
+        create=instructor.patch(create=_create, mode=instructor.Mode.TOOLS),
+        mode=instructor.Mode.TOOLS
     )
 
-    messsages = state.messages
 
-    conversations =[]
+async def _create_agent_response(messages):
+    client = instructor.from_openai(get_async_openai_client())
+
+    response, raw_response = await client.chat.completions.create_with_completion(
+        model="gpt-4o-mini",
+        response_model=AgentResponse,
+        messages=messages,
+        temperature=0.5
+    )
+
+    return response, raw_response.usage
 
-    for message in messsages:
-        conversations.append(convert_to_openai_messages(message))
 
-    client = instructor.from_openai(OpenAI())
+async def _stream_agent_response(messages, writer):
+    """Stream an AgentResponse, writing answer deltas and the settled references to the graph stream.
 
-    response, raw_response = client.chat.completions.create_with_completion(
+    Nothing is written for turns that call tools.
+    """
+
+    usage = []
+    client = _streaming_instructor_client(usage)
+
+    streamed_answer = ""
+    partial = None
+
+    async for partial in client.chat.completions.create_partial(
         model="gpt-4o-mini",
         response_model=AgentResponse,
-        messages=[{"role": "system", "content": prompt}, *conversations],
+        messages=messages,
         temperature=0.5
+    ):
+        answer = partial.answer or ""
+
+        if not answer or partial.tool_calls:
+            continue
+
+        if not streamed_answer:
+            writer({"type": "references", "references": [reference.model_dump() for reference in partial.references or []]})
+
+        if len(answer) > len(streamed_answer) and answer.startswith(streamed_answer):
+            writer({"type": "answer_delta", "delta": answer[len(streamed_answer):]})
+            streamed_answer = answer
+
+    if partial is None:
+        # Nothing was streamed, so nothing was written either; ask again without streaming
+        logger.warning("Streamed agent response was empty, retrying without streaming")
+        return await _create_agent_response(messages)
+
+    response = AgentResponse.model_validate(partial.model_dump())
+
+    return response, usage[-1] if usage else None
+
+
+@traceable(
+    name="agent_node",
+    run_type="llm",
+    metadata={"ls_provider": "openai", "ls_model_name": "gpt-4o-mini"}
+)
+async def agent_node(state, writer: StreamWriter = None) -> dict:
+
+    template = get_prompt_template("qa_agent")
+
+    prompt = template.render(
+        available_tools=get_available_tools()
     )
 
+    messages = [{"role": "system", "content": prompt}, *history_messages(state)]
+
+    if config.STREAM_ANSWER_TOKENS and writer is not None:
+        response, usage = await _stream_agent_response(messages, writer)
+    else:
+        response, usage = await _create_agent_response(messages)
+
+
+    usage_metadata = {
+        "input_tokens": usage.prompt_tokens,
+        "output_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens
+    } if usage else None
 
     current_run = get_current_run_tree()
 
-    if current_run:
-        current_run.metadata["usage_metadata"] = {
-            "input_tokens": raw_response.usage.prompt_tokens,
-            "output_tokens": raw_response.usage.completion_tokens,
-            "total_tokens": raw_response.usage.total_tokens
-        }
+    if current_run and usage_metadata:
+        current_run.metadata["usage_metadata"] = usage_metadata
 
 
     ai_message = format_ai_message(response)
+    ai_message.usage_metadata = usage_metadata
 
     return {
         "messages": [ai_message],
@@ -92,22 +174,40 @@ def agent_node(state) -> dict:
     run_type="llm",
     metadata={"ls_provider": "openai", "ls_model_name": "gpt-4.1-mini"}
 )
-def intent_router_node(state):
+async def intent_router_node(state):
 
-    template = prompt_template_config("api/agents/prompts/intent_router_agent.yaml", "intent_router_agent")
-
-    prompt = template.render()
+    conversations = router_messages(state, config.ROUTER_CONTEXT_TURNS, config.ROUTER_TURN_MAX_TOKENS)
 
-    messsages = state.messages
-
-    conversations =[]
+    current_run = get_current_run_tree()
+    trace_id = str(getattr(current_run, "trace_id", current_run.id)) if current_run else None
+
+    # Questions close to the catalog are accepted without the LLM; everything else, including the
+    # explanation for off-topic questions, is left to it
+    if config.ROUTER_LOCAL_CLASSIFIER and conversations and conversations[-1]["role"] == "user":
+        similarity = await catalog_similarity(str(conversations[-1]["content"]))
+        accepted = similarity >= config.ROUTER_CATALOG_SIMILARITY_THRESHOLD
+
+        if current_run:
+            current_run.metadata["local_classifier"] = {
+                "similarity": similarity,
+                "threshold": config.ROUTER_CATALOG_SIMILARITY_THRESHOLD,
+                "accepted": accepted
+            }
+
+        if accepted:
+            return {
+                "question_relevant": True,
+                "answer": "",
+                "trace_id": trace_id
+            }
+
+    template = get_prompt_template("intent_router_agent")
 
-    for message in messsages:
-        conversations.append(convert_to_openai_messages(message))
+    prompt = template.render()
 
-    client = instructor.from_openai(OpenAI())
+    client = instructor.from_openai(get_async_openai_client())
 
-    response, raw_response = client.chat.completions.create_with_completion(
+    response, raw_response = await client.chat.completions.create_with_completion(
         model="gpt-4.1-mini",
         messages=[
             {"role": "system", "content": prompt},
@@ -116,8 +216,6 @@ def intent_router_node(state):
         response_model=IntentRouterResponse,
     )
 
-    current_run = get_current_run_tree()
-
     if current_run:
         current_run.metadata["usage_metadata"] = {
             "input_tokens": raw_response.usage.prompt_tokens,
@@ -125,13 +223,155 @@ def intent_router_node(state):
             "total_tokens": raw_response.usage.total_tokens
         }
 
-        trace_id = str(getattr(current_run, "trace_id", current_run.id))
-    else:
-        trace_id = None
-
 
     return {
         "question_relevant": response.question_relevant,
         "answer": response.answer,
         "trace_id": trace_id
-    }
\ No newline at end of file
+    }
+
+
+### History Compaction Node
+
+@traceable(
+    name="summarize_history",
+    run_type="llm",
+    metadata={"ls_provider": "openai", "ls_model_name": "gpt-4.1-mini"}
+)
+async def summarize_history(summary: str, messages: List[dict]) -> str:
+
+    template = get_prompt_template("history_summary")
+
+    prompt = template.render(summary=summary, messages=messages)
+
+    response = await get_async_openai_client().chat.completions.create(
+        model="gpt-4.1-mini",
+        messages=[{"role": "system", "content": prompt}],
+        temperature=0
+    )
+
+    current_run = get_current_run_tree()
+
+    if current_run:
+        current_run.metadata["usage_metadata"] = {
+            "input_tokens": response.usage.prompt_tokens,
+            "output_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens
+        }
+
+    return response.choices[0].message.content.strip()
+
+
+@traceable(
+    name="compact_history_node",
+    run_type="chain"
+)
+async def compact_history_node(state) -> dict:
+    """Fold the oldest finished turns into the persisted history summary once the thread outgrows its
+    window or token budget. The summary is only recomputed when turns are folded."""
+
+    folded = turns_to_fold(state, config.HISTORY_WINDOW_TURNS, config.HISTORY_MAX_TOKENS)
+
+    if not folded:
+        return {}
+
+    tokens_before = message_tokens(history_messages(state))
+
+    summary = await summarize_history(
+        state.history_summary,
+        [message for turn in folded for message in without_tool_output(turn)]
+    )
+
+    update = {
+        "history_summary": summary,
+        "summarized_messages": state.summarized_messages + sum(len(turn) for turn in folded)
+    }
+
+    current_run = get_current_run_tree()
+
+    if current_run:
+        current_run.metadata["history_compaction"] = {
+            "turns_folded": len(folded),
+            "tokens_before": tokens_before,
+            "tokens_after": message_tokens(history_messages(state.model_copy(update=update)))
+        }
+
+    return update
+
+
+### Speculative Intent Router Node
+
+@traceable(
+    name="speculative_router_node",
+    run_type="chain"
+)
+async def speculative_router_node(state, writer: StreamWriter = None):
+    """Run the intent router and the agent's first turn concurrently.
+
+    The agent's result is kept only if the router marks the question as relevant; otherwise
+    the agent call is cancelled (or its finished result discarded). Anything the agent streams
+    is held back until the router has answered.
+    """
+
+    async def _timed(coro):
+        started = time.perf_counter()
+        result = await coro
+        return result, time.perf_counter() - started
+
+    started = time.perf_counter()
+
+    held_back = []
+
+    def _agent_writer(chunk):
+        if held_back and held_back[0] is None:
+            writer(chunk)
+        else:
+            held_back.append(chunk)
+
+    agent_task = asyncio.create_task(_timed(agent_node(state, writer=_agent_writer if writer else None)))
+    try:
+        router_update, router_latency = await _timed(intent_router_node(state))
+    except BaseException:
+        agent_task.cancel()
+        raise
+
+    current_run = get_current_run_tree()
+
+    if not router_update["question_relevant"]:
+        agent_finished = agent_task.done()
+        agent_task.cancel()
+
+        wasted_tokens = None
+        if agent_finished and not agent_task.cancelled() and agent_task.exception() is None:
+            agent_update, _ = agent_task.result()
+            wasted_tokens = agent_update["messages"][0].usage_metadata
+
+        if current_run:
+            current_run.metadata["speculation"] = {
+                "used": False,
+                "agent_cancelled": not agent_finished,
+                "wasted_tokens": wasted_tokens,
+                "router_latency_s": router_latency
+            }
+
+        return router_update
+
+    for chunk in held_back:
+        writer(chunk)
+    held_back[:] = [None]
+
+    agent_update, agent_latency = await agent_task
+    total_latency = time.perf_counter() - started
+
+    if current_run:
+        current_run.metadata["speculation"] = {
+            "used": True,
+            "router_latency_s": router_latency,
+            "agent_latency_s": agent_latency,
+            "latency_saved_s": router_latency + agent_latency - total_latency
+        }
+
+    return {
+        **router_update,
+        **agent_update
+    }
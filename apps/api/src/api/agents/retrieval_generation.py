@@ -1,11 +1,13 @@
 import openai
-from qdrant_client import QdrantClient
+from api.core.clients import get_qdrant_client
 from langsmith import traceable, get_current_run_tree
 from pydantic import BaseModel, Field
 import instructor
-import numpy as np
-from qdrant_client.models import Filter, FieldCondition, MatchValue, Prefetch, Document, FusionQuery
-from api.agents.utils.prompt_management import prompt_template_config
+from dataclasses import replace
+from api.agents.utils.prompt_management import get_prompt_template
+from api.agents.utils.hydration import hydrate_references
+from api.agents.utils.embeddings import get_embedding_service
+from api.agents.utils.vector_search import ITEMS_SEARCH
 
 
 class RAGUsedContext(BaseModel):
@@ -16,66 +18,22 @@ class RAGGenerationRepsonse(BaseModel):
     answer: str = Field(description="The suggested items to the question following the format: 'Name of the item (ID of the item)'")
     reference: list[RAGUsedContext] = Field(description="The list of items used to answer the question")  
 
-@traceable(
-    name="embed_query",
-    run_type="embedding",
-    metadata={"ls_provider": "openai", "ls_model_name": "text-embedding-3-small"}
-)
-def get_embeddings(text, model="text-embedding-3-small"):
-    response = openai.embeddings.create(
-        input=text,
-        model=model
-    )
-
-    current_run = get_current_run_tree()
-    if current_run:
-        current_run.metadata["usage_metadata"] = {
-            "input_tokens": response.usage.prompt_tokens,
-            "total_tokens": response.usage.total_tokens
-        }
-
-    return response.data[0].embedding
-
 @traceable(
     name="retrieve_data",
     run_type="retriever"
 )
-def retrieve_data(query, qdrant_client, k=5):
-    query_embedding = get_embeddings(query)
-    results = qdrant_client.query_points(
-        collection_name="Amazon-items-collection-01-hybrid-search-v2",
-        prefetch=[
-            Prefetch(
-                query=query_embedding,
-                using="text-embedding-3-small",
-                limit=20
-            ),
-            Prefetch(
-                query=Document(text=query, model="Qdrant/bm25"),
-                using="bm25",
-                limit=20
-            )
-        ],
-        query=FusionQuery(fusion="rrf"),
-        limit=k
-    )
-
-    retrieved_context_ids = []
-    retrieved_context= []
-    similiarity_scores = []
-    retrieved_context_ratings = []
+def retrieve_data(query, qdrant_client, k=5, collection_name=None, dimensions=None, search_params=None):
+    query_embedding = get_embedding_service().get_embedding(query, dimensions=dimensions)
 
-    for result in results.points:
-        retrieved_context_ids.append(result.payload['parent_asin'])
-        retrieved_context.append(result.payload['description'])
-        similiarity_scores.append(result.score)
-        retrieved_context_ratings.append(result.payload['average_rating'])
+    search = replace(ITEMS_SEARCH, collection_name=collection_name) if collection_name else ITEMS_SEARCH
+    chunks = search.search(qdrant_client, query, query_embedding, k, search_params=search_params)
 
+    # Column-wise, as rag_pipeline and the evaluators consume it
     return {
-        "retrieved_context_ids": retrieved_context_ids,
-        "retrieved_context": retrieved_context,
-        "similiarity_scores": similiarity_scores,
-        "retrieved_context_ratings": retrieved_context_ratings
+        "retrieved_context_ids": [chunk.id for chunk in chunks],
+        "retrieved_context": [chunk.text for chunk in chunks],
+        "similiarity_scores": [chunk.score for chunk in chunks],
+        "retrieved_context_ratings": [chunk.rating for chunk in chunks]
     }
 
 @traceable(
@@ -84,12 +42,10 @@ def retrieve_data(query, qdrant_client, k=5):
 )
 def process_context(context):
 
-    formatted_context = ""
-
-    for id, chunk, rating in zip(context['retrieved_context_ids'], context['retrieved_context'], context['retrieved_context_ratings']):
-        formatted_context += f"- ID: {id}, Rating: {rating}, Description: {chunk}\n"
-
-    return formatted_context
+    return "".join(
+        f"- ID: {id}, Rating: {rating}, Description: {chunk}\n"
+        for id, chunk, rating in zip(context['retrieved_context_ids'], context['retrieved_context'], context['retrieved_context_ratings'])
+    )
 
 @traceable(
     name="build_prompt",
@@ -97,7 +53,7 @@ def process_context(context):
 )
 def build_prompt(preprocessed_context, question):
 
-    template = prompt_template_config("api/agents/prompts/retrieval_generation.yaml", "retrieval_generation")
+    template = get_prompt_template("retrieval_generation")
     prompt = template.render(preprocessed_context=preprocessed_context, question=question)
 
     return prompt
@@ -153,38 +109,11 @@ def rag_pipeline(question, qdrant_client, k=5):
 
 def rag_pipeline_wrapper(question, k=5):
 
-    qdrant_client = QdrantClient(url="http://qdrant:6333")
+    qdrant_client = get_qdrant_client()
 
     result = rag_pipeline(question, qdrant_client, k)
 
-    used_context = []
-    dummy_vector = np.zeros(1536).tolist()
-
-    for item in result.get('reference', []):
-        payload = qdrant_client.query_points(
-            collection_name="Amazon-items-collection-01-hybrid-search-v2",
-            query=dummy_vector,
-            limit=1,
-            using="text-embedding-3-small",
-            with_payload=True,
-            query_filter=Filter(
-                must=[
-                    FieldCondition(
-                        key="parent_asin",
-                        match=MatchValue(value=item.id)
-                    )
-                ]
-            )
-        ).points[0].payload
-        image_url = payload.get('image', '')
-        price = payload.get('price', '')
-        if image_url:
-            used_context.append({
-                "description": item.description,
-                "image_url": image_url,
-                "price": price,
-                "id": item.id
-            })
+    used_context = hydrate_references(qdrant_client, result.get('reference', []))
 
     return {
         "answer": result['answer'],
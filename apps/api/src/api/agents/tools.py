@@ -1,28 +1,37 @@
-import openai
-from langsmith import traceable, get_current_run_tree
-from qdrant_client import QdrantClient
-from qdrant_client.models import Prefetch, Filter, FieldCondition, MatchText, FusionQuery, Document, VectorParams, Distance, PayloadSchemaType, PointStruct, MatchAny
+from functools import lru_cache
+from typing import List
+import json
+from langsmith import traceable
+from api.core.clients import get_async_qdrant_client
+from api.core.config import config
+from api.agents.utils.context_budget import budget_chunks
+from api.agents.utils.embeddings import get_embedding_service
+from api.agents.utils.mcp_pool import get_mcp_tool_transport
+from api.agents.utils.rerank import get_reranker
+from api.agents.utils.utils import get_tool_descriptions
+from api.agents.utils.vector_search import ITEMS_SEARCH, REVIEWS_SEARCH, RetrievedChunk
+from qdrant_client.models import Filter, FieldCondition, MatchAny
 
 
-@traceable(
-    name="embed_query",
-    run_type="embedding",
-    metadata={"ls_provider": "openai", "ls_model_name": "text-embedding-3-small"}
-)
-def get_embeddings(text, model="text-embedding-3-small"):
-    response = openai.embeddings.create(
-        input=text,
-        model=model
-    )
+async def mcp_search(tool_name, k, **arguments) -> List[RetrievedChunk]:
+    """Chunks from a search tool of the MCP servers (TOOL_TRANSPORT="mcp"); reranking and formatting stay here."""
+
+    content = await get_mcp_tool_transport().call_tool(tool_name, {**arguments, "top_k": k})
+
+    return [RetrievedChunk(**chunk) for chunk in json.loads(content)]
+
+
+async def search_and_rerank(fetch, query, k):
+    """fetch(n) returns the top n chunks; when a reranker is configured, an overfetched candidate set is reranked down to k."""
+
+    reranker = get_reranker()
 
-    current_run = get_current_run_tree()
-    if current_run:
-        current_run.metadata["usage_metadata"] = {
-            "input_tokens": response.usage.prompt_tokens,
-            "total_tokens": response.usage.total_tokens
-        }
+    if reranker is None:
+        return await fetch(k)
 
-    return response.data[0].embedding
+    candidates = await fetch(reranker.candidates(k))
+
+    return await reranker.rerank(query, candidates, k)
 
 
 ### Item Description Retrieval Tool
@@ -31,47 +40,18 @@ def get_embeddings(text, model="text-embedding-3-small"):
     name="retrieve_data",
     run_type="retriever"
 )
-def retrieve_items_data(query, k=5):
-
-    query_embedding = get_embeddings(query)
-
-    qdrant_client = QdrantClient(url="http://qdrant:6333")
-
-    results = qdrant_client.query_points(
-        collection_name="Amazon-items-collection-01-hybrid-search-v2",
-        prefetch=[
-            Prefetch(
-                query=query_embedding,
-                using="text-embedding-3-small",
-                limit=20
-            ),
-            Prefetch(
-                query=Document(text=query, model="Qdrant/bm25"),
-                using="bm25",
-                limit=20
-            )
-        ],
-        query=FusionQuery(fusion="rrf"),
-        limit=k
-    )
+async def retrieve_items_data(query, k=5):
 
-    retrieved_context_ids = []
-    retrieved_context= []
-    similiarity_scores = []
-    retrieved_context_ratings = []
+    if config.TOOL_TRANSPORT == "mcp":
+        return await search_and_rerank(lambda n: mcp_search("search_items", n, query=query), query, k)
 
-    for result in results.points:
-        retrieved_context_ids.append(result.payload['parent_asin'])
-        retrieved_context.append(result.payload['description'])
-        similiarity_scores.append(result.score)
-        retrieved_context_ratings.append(result.payload['average_rating'])
+    query_embedding = await get_embedding_service().aget_embedding(query)
 
-    return {
-        "retrieved_context_ids": retrieved_context_ids,
-        "retrieved_context": retrieved_context,
-        "similiarity_scores": similiarity_scores,
-        "retrieved_context_ratings": retrieved_context_ratings
-    }
+    return await search_and_rerank(
+        lambda n: ITEMS_SEARCH.asearch(get_async_qdrant_client(), query, query_embedding, n),
+        query,
+        k
+    )
 
 @traceable(
     name="format_retrieved_context",
@@ -79,15 +59,10 @@ def retrieve_items_data(query, k=5):
 )
 def process_items_context(context):
 
-    formatted_context = ""
-
-    for id, chunk, rating in zip(context['retrieved_context_ids'], context['retrieved_context'], context['retrieved_context_ratings']):
-        formatted_context += f"- ID: {id}, Rating: {rating}, Description: {chunk}\n"
-
-    return formatted_context
+    return "".join(f"- ID: {chunk.id}, Rating: {chunk.rating}, Description: {chunk.text}\n" for chunk in budget_chunks(context))
 
 
-def get_formatted_items_context(query: str, top_k: int =5) -> str:
+async def get_formatted_items_context(query: str, top_k: int =5) -> str:
 
     """
     Get the top k context, each representing an inventory item for a given query.
@@ -100,7 +75,7 @@ def get_formatted_items_context(query: str, top_k: int =5) -> str:
         A string of the top k context chunks with IDs and average ratings prepending to each chunk, each represending an inventory item a given query.
     """
 
-    context = retrieve_items_data(query, top_k)
+    context = await retrieve_items_data(query, top_k)
 
     formatted_context = process_items_context(context)
 
@@ -114,44 +89,27 @@ def get_formatted_items_context(query: str, top_k: int =5) -> str:
     name="retrieve_reviews_data",
     run_type="retriever"
 )
-def retrieve_reviews_data(query, item_list, k=5):
-
-    query_embedding = get_embeddings(query)
-
-    qdrant_client = QdrantClient(url="http://qdrant:6333")
-
-    results = qdrant_client.query_points(
-        collection_name="Amazon-reviews-collection-01-reviews",
-        prefetch=Prefetch(
-            query=query_embedding,
-            filter=Filter(
-                must=[
-                    FieldCondition(
-                        key="parent_asin",
-                        match=MatchAny(any=item_list)
-                    )
-                ]
-            ),
-            limit=20
-        ),
-        query=FusionQuery(fusion='rrf'),
-        limit=k
-    )
+async def retrieve_reviews_data(query, item_list, k=5):
 
-    retrieved_context_ids = []
-    retrieved_context= []
-    similiarity_scores = []
+    if config.TOOL_TRANSPORT == "mcp":
+        return await search_and_rerank(lambda n: mcp_search("search_reviews", n, query=query, item_list=item_list), query, k)
 
-    for result in results.points:
-        retrieved_context_ids.append(result.payload['parent_asin'])
-        retrieved_context.append(result.payload['text'])
-        similiarity_scores.append(result.score)
+    query_embedding = await get_embedding_service().aget_embedding(query)
 
-    return {
-        "retrieved_context_ids": retrieved_context_ids,
-        "retrieved_context": retrieved_context,
-        "similiarity_scores": similiarity_scores,
-    }
+    query_filter = Filter(
+        must=[
+            FieldCondition(
+                key="parent_asin",
+                match=MatchAny(any=item_list)
+            )
+        ]
+    )
+
+    return await search_and_rerank(
+        lambda n: REVIEWS_SEARCH.asearch(get_async_qdrant_client(), query, query_embedding, n, query_filter=query_filter),
+        query,
+        k
+    )
 
 @traceable(
     name="format_retrieved_reviews_context",
@@ -159,15 +117,12 @@ def retrieve_reviews_data(query, item_list, k=5):
 )
 def process_reviews_context(context):
 
-    formatted_context = ""
-
-    for id, chunk in zip(context['retrieved_context_ids'], context['retrieved_context']):
-        formatted_context += f"- ID: {id}, Review: {chunk}\n"
+    chunks = budget_chunks(context, max_chunks_per_id=config.CONTEXT_MAX_CHUNKS_PER_ITEM)
 
-    return formatted_context
+    return "".join(f"- ID: {chunk.id}, Review: {chunk.text}\n" for chunk in chunks)
 
 
-def get_formatted_reviews_context(query: str, item_list: list, top_k: int =15) -> str:
+async def get_formatted_reviews_context(query: str, item_list: list, top_k: int =15) -> str:
 
     """
     Get the top k reviews mathcing a query for a list of prefiltered items.
@@ -181,8 +136,20 @@ def get_formatted_reviews_context(query: str, item_list: list, top_k: int =15) -
         A string of the top k reviews with IDs prepending to each review, each represending a review for a given query and item.
     """
 
-    context = retrieve_reviews_data(query, item_list, top_k)
+    context = await retrieve_reviews_data(query, item_list, top_k)
 
     formatted_context = process_reviews_context(context)
 
-    return formatted_context
\ No newline at end of file
+    return formatted_context
+
+
+### Tool Registry
+
+TOOLS = [get_formatted_items_context, get_formatted_reviews_context]
+
+
+@lru_cache(maxsize=1)
+def get_available_tools():
+    """Tool schemas for the agent prompt, parsed from the tool sources once per process."""
+
+    return get_tool_descriptions(TOOLS)
@@ -0,0 +1,250 @@
+from functools import lru_cache
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+import numpy as np
+from langsmith import traceable, get_current_run_tree
+from qdrant_client.models import Distance, FieldCondition, Filter, FilterSelector, MatchValue, PointStruct, Range, VectorParams
+
+from api.agents.utils.embeddings import get_embedding_service
+from api.core.clients import get_async_qdrant_client
+from api.core.config import config
+
+
+logger = logging.getLogger(__name__)
+
+# How long a items-collection fingerprint is trusted before Qdrant is asked again
+FINGERPRINT_REFRESH_SECONDS = 30
+
+
+async def items_collection_fingerprint(qdrant_client, collection_name=config.QDRANT_ITEMS_COLLECTION) -> str:
+    """Identify the current contents of the items collection; it changes when the collection is re-ingested
+    or its alias is switched to a new generation.
+
+    Uses the generation id the ingest pipeline writes into the collection metadata, or the point count
+    for collections ingested before it did.
+    """
+
+    for description in (await qdrant_client.get_aliases()).aliases:
+        if description.alias_name == collection_name:
+            collection_name = description.collection_name
+            break
+
+    info = await qdrant_client.get_collection(collection_name)
+
+    generation = (info.config.metadata or {}).get("ingest_generation")
+
+    return f"{collection_name}:{generation or info.points_count}"
+
+
+#### IN-MEMORY INDEX ####
+class InMemoryAnswerIndex:
+    """Cached answers in a process-local matrix of normalized query embeddings, searched by dot product."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._entries = []
+        self._lock = threading.Lock()
+
+    async def search(self, embedding, threshold, fingerprint, not_before):
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        with self._lock:
+            if not self._entries:
+                return None
+
+            scores = self._vectors @ query
+            for i in np.argsort(-scores):
+                if scores[i] < threshold:
+                    return None
+                entry = self._entries[i]
+                if entry["fingerprint"] == fingerprint and entry["created_at"] >= not_before:
+                    return float(scores[i]), entry
+
+        return None
+
+    async def add(self, embedding, entry):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+
+        with self._lock:
+            if not self._entries:
+                self._vectors = vector[None, :]
+            else:
+                self._vectors = np.vstack([self._vectors, vector])
+            self._entries.append(entry)
+
+            if len(self._entries) > self.max_entries:
+                overflow = len(self._entries) - self.max_entries
+                self._vectors = self._vectors[overflow:]
+                self._entries = self._entries[overflow:]
+
+    async def clear(self, keep_fingerprint=None):
+        with self._lock:
+            keep = [i for i, entry in enumerate(self._entries) if keep_fingerprint and entry["fingerprint"] == keep_fingerprint]
+            self._vectors = self._vectors[keep] if keep else np.empty((0, 0), dtype=np.float32)
+            self._entries = [self._entries[i] for i in keep]
+
+
+#### QDRANT INDEX ####
+class QdrantAnswerIndex:
+    """Cached answers in a small dedicated Qdrant collection, shared by every API worker."""
+
+    def __init__(self, qdrant_client, collection_name: str):
+        self.qdrant_client = qdrant_client
+        self.collection_name = collection_name
+        self._ready = False
+
+    async def _ensure_collection(self, size):
+        if self._ready:
+            return
+
+        if not await self.qdrant_client.collection_exists(self.collection_name):
+            await self.qdrant_client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=size, distance=Distance.COSINE)
+            )
+        self._ready = True
+
+    async def search(self, embedding, threshold, fingerprint, not_before):
+        await self._ensure_collection(len(embedding))
+
+        response = await self.qdrant_client.query_points(
+            collection_name=self.collection_name,
+            query=embedding,
+            query_filter=Filter(
+                must=[
+                    FieldCondition(key="fingerprint", match=MatchValue(value=fingerprint)),
+                    FieldCondition(key="created_at", range=Range(gte=not_before))
+                ]
+            ),
+            score_threshold=threshold,
+            limit=1,
+            with_payload=True
+        )
+
+        if not response.points:
+            return None
+
+        return response.points[0].score, response.points[0].payload
+
+    async def add(self, embedding, entry):
+        await self._ensure_collection(len(embedding))
+
+        await self.qdrant_client.upsert(
+            collection_name=self.collection_name,
+            points=[PointStruct(id=str(uuid.uuid4()), vector=embedding, payload=entry)],
+            wait=False
+        )
+
+    async def clear(self, keep_fingerprint=None):
+        # Delete points, not the collection: the other workers keep using it
+        if not await self.qdrant_client.collection_exists(self.collection_name):
+            return
+
+        await self.qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=Filter(
+                must_not=[FieldCondition(key="fingerprint", match=MatchValue(value=keep_fingerprint))] if keep_fingerprint else []
+            )),
+            wait=False
+        )
+
+
+#### SEMANTIC ANSWER CACHE ####
+class SemanticAnswerCache:
+    """Answers to first-turn questions, looked up by cosine similarity of the query embedding.
+
+    Entries expire after ttl_seconds and are ignored once the items collection fingerprint changes.
+    """
+
+    def __init__(self, index, qdrant_client, threshold: float, ttl_seconds: int):
+        self.index = index
+        self.qdrant_client = qdrant_client
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._fingerprint = None
+        self._fingerprint_checked_at = 0.0
+        self._fingerprint_lock = asyncio.Lock()
+
+    async def fingerprint(self) -> str:
+        async with self._fingerprint_lock:
+            if time.monotonic() - self._fingerprint_checked_at > FINGERPRINT_REFRESH_SECONDS:
+                fingerprint = await items_collection_fingerprint(self.qdrant_client)
+
+                if self._fingerprint is not None and fingerprint != self._fingerprint:
+                    logger.info(f"Items collection changed ({self._fingerprint} -> {fingerprint}), dropping cached answers")
+                    await self.index.clear(keep_fingerprint=fingerprint)
+
+                self._fingerprint = fingerprint
+                self._fingerprint_checked_at = time.monotonic()
+
+        return self._fingerprint
+
+    @traceable(
+        name="semantic_cache_lookup",
+        run_type="retriever"
+    )
+    async def lookup(self, question: str):
+        """Return the cached answer for a near-duplicate question, or None."""
+
+        embedding = await get_embedding_service().aget_embedding(question)
+        not_before = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+
+        match = await self.index.search(embedding, self.threshold, await self.fingerprint(), not_before)
+
+        current_run = get_current_run_tree()
+        if current_run:
+            current_run.metadata["semantic_cache"] = {
+                "hit": match is not None,
+                "similarity": match[0] if match else None,
+                "threshold": self.threshold
+            }
+
+        if match is None:
+            return None
+
+        return {**match[1], "trace_id": str(current_run.trace_id) if current_run else ""}
+
+    async def store(self, question: str, answer: str, used_context: list, references: list):
+        embedding = await get_embedding_service().aget_embedding(question)
+
+        await self.index.add(embedding, {
+            "question": question,
+            "answer": answer,
+            "used_context": used_context,
+            "references": references,
+            "fingerprint": await self.fingerprint(),
+            "created_at": time.time()
+        })
+
+    async def invalidate(self):
+        """Drop every cached answer, e.g. after the items collection was re-ingested."""
+
+        await self.index.clear()
+        self._fingerprint_checked_at = 0.0
+
+
+@lru_cache(maxsize=1)
+def get_semantic_answer_cache() -> SemanticAnswerCache:
+    qdrant_client = get_async_qdrant_client()
+    backend = config.SEMANTIC_CACHE_BACKEND
+
+    if backend == "memory":
+        index = InMemoryAnswerIndex(config.SEMANTIC_CACHE_MAX_ENTRIES)
+    elif backend == "qdrant":
+        index = QdrantAnswerIndex(qdrant_client, config.SEMANTIC_CACHE_COLLECTION)
+    else:
+        raise ValueError(f"Unknown SEMANTIC_CACHE_BACKEND: {backend!r} (expected 'memory' or 'qdrant')")
+
+    return SemanticAnswerCache(
+        index=index,
+        qdrant_client=qdrant_client,
+        threshold=config.SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds=config.SEMANTIC_CACHE_TTL_SECONDS
+    )
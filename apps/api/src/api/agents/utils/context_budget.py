@@ -0,0 +1,142 @@
+from dataclasses import replace
+from functools import lru_cache
+from typing import List, Tuple
+
+import tiktoken
+from langsmith import traceable, get_current_run_tree
+
+from api.agents.utils.embeddings import normalize_text
+from api.agents.utils.vector_search import RetrievedChunk
+from api.core.config import config
+
+
+# The model the tool context is sent to
+TOKENIZER_MODEL = "gpt-4.1-mini"
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """Cut text to at most max_tokens tokens; returns the text and whether it was cut."""
+
+    tokens = get_encoding().encode(text, disallowed_special=())
+
+    if not max_tokens or len(tokens) <= max_tokens:
+        return text, False
+
+    return get_encoding().decode(tokens[:max_tokens]).rstrip() + "…", True
+
+
+#### PER-CALL CHUNK BUDGET ####
+def budget_chunks(
+    chunks: List[RetrievedChunk],
+    max_chunk_tokens: int = config.CONTEXT_CHUNK_MAX_TOKENS,
+    max_chunks_per_id: int = 0
+) -> List[RetrievedChunk]:
+    """Drop repeated chunks of an item, keep at most max_chunks_per_id per item (0 = all) and truncate long ones.
+
+    Chunks arrive in rank order, so the best ones are kept. Savings are recorded in the current run's metadata.
+    """
+
+    seen, per_id, kept = set(), {}, []
+    stats = {"chunks_in": len(chunks), "duplicates": 0, "over_item_cap": 0, "truncated": 0, "tokens_in": 0, "tokens_out": 0}
+
+    for chunk in chunks:
+        tokens = count_tokens(chunk.text)
+        stats["tokens_in"] += tokens
+
+        key = (chunk.id, normalize_text(chunk.text))
+        if key in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(key)
+
+        if max_chunks_per_id and per_id.get(chunk.id, 0) >= max_chunks_per_id:
+            stats["over_item_cap"] += 1
+            continue
+        per_id[chunk.id] = per_id.get(chunk.id, 0) + 1
+
+        if max_chunk_tokens and tokens > max_chunk_tokens:
+            text, _ = truncate_tokens(chunk.text, max_chunk_tokens)
+            chunk = replace(chunk, text=text)
+            stats["truncated"] += 1
+            tokens = max_chunk_tokens
+
+        stats["tokens_out"] += tokens
+        kept.append(chunk)
+
+    stats["chunks_out"] = len(kept)
+
+    current_run = get_current_run_tree()
+    if current_run:
+        current_run.metadata["context_budget"] = stats
+
+    return kept
+
+
+#### PER-TURN TOOL CONTEXT CAP ####
+def _allowances(sizes: List[int], max_tokens: int) -> List[int]:
+    """Split max_tokens across outputs: ones below an equal share keep their size, the rest share what is left."""
+
+    allowances = [0] * len(sizes)
+    remaining = max_tokens
+
+    for position, i in enumerate(sorted(range(len(sizes)), key=sizes.__getitem__)):
+        allowances[i] = min(sizes[i], remaining // (len(sizes) - position))
+        remaining -= allowances[i]
+
+    return allowances
+
+
+def _trim_lines(content: str, max_tokens: int) -> str:
+    """Keep whole lines (one retrieved chunk each, best first) while they fit in max_tokens."""
+
+    kept, used = [], 0
+
+    for line in content.splitlines(keepends=True):
+        tokens = count_tokens(line)
+        if used + tokens > max_tokens:
+            break
+        kept.append(line)
+        used += tokens
+
+    if not kept and max_tokens:
+        return truncate_tokens(content, max_tokens)[0]
+
+    return "".join(kept)
+
+
+@traceable(
+    name="budget_tool_context",
+    run_type="prompt"
+)
+def cap_tool_context(contents: List[str], max_tokens: int = config.TOOL_CONTEXT_MAX_TOKENS) -> List[str]:
+    """Fit the outputs of all tool calls of one agent turn into max_tokens by dropping their lowest-ranked lines."""
+
+    sizes = [count_tokens(content) for content in contents]
+
+    if not max_tokens or sum(sizes) <= max_tokens:
+        capped = contents
+    else:
+        capped = [
+            content if size <= allowance else _trim_lines(content, allowance)
+            for content, size, allowance in zip(contents, sizes, _allowances(sizes, max_tokens))
+        ]
+
+    current_run = get_current_run_tree()
+    if current_run:
+        current_run.metadata["context_budget"] = {
+            "max_tokens": max_tokens,
+            "tokens_in": sum(sizes),
+            "tokens_out": sum(map(count_tokens, capped)) if capped is not contents else sum(sizes),
+            "outputs_trimmed": sum(1 for before, after in zip(contents, capped) if before is not after)
+        }
+
+    return capped
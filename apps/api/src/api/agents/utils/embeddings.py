@@ -0,0 +1,318 @@
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from langsmith import traceable, get_current_run_tree
+
+from api.core.clients import get_async_openai_client, get_openai_client
+from api.core.config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a query for cache lookups: unicode form, case and whitespace."""
+
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def cache_key(model: str, text: str, dimensions: int = 0) -> str:
+    return hashlib.sha256(f"{model}\x00{dimensions}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def dimensions_kwargs(dimensions: int) -> dict:
+    """Embeddings API arguments for a Matryoshka-truncated size; 0 keeps the model's full size."""
+
+    return {"dimensions": dimensions} if dimensions else {}
+
+
+#### IN-PROCESS LRU TIER ####
+class EmbeddingLRUCache:
+    """Thread-safe LRU of embeddings bounded by entry count and approximate memory."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                return None
+            self._entries.move_to_end(key)
+            return vector.tolist()
+
+    def set(self, key, embedding):
+        vector = array("f", embedding)
+        size = vector.itemsize * len(vector)
+
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries[key].itemsize * len(self._entries[key])
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.itemsize * len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+#### SHARED SECOND TIER ####
+class SQLiteEmbeddingStore:
+    """Embedding store in a local SQLite file, shared by every worker on the host."""
+
+    def __init__(self, path: str, ttl_seconds: int = 0):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            return None
+        if self.ttl_seconds and time.time() - row[1] > self.ttl_seconds:
+            return None
+
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def set(self, key, embedding):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                (key, array("f", embedding).tobytes(), time.time())
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class RedisEmbeddingStore:
+    """Embedding store in any server speaking the Redis protocol (Redis, Valkey, a local stand-in)."""
+
+    def __init__(self, url: str, ttl_seconds: int = 0, prefix: str = "embedding:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("The redis embedding cache backend requires the `redis` extra: `uv sync --extra redis`.") from e
+
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            return None
+
+        vector = array("f")
+        vector.frombytes(raw)
+        return vector.tolist()
+
+    def set(self, key, embedding):
+        self._client.set(self.prefix + key, array("f", embedding).tobytes(), ex=self.ttl_seconds or None)
+
+    def close(self):
+        self._client.close()
+
+
+#### EMBEDDING SERVICE ####
+class EmbeddingService:
+    """Query embeddings behind an in-process LRU and an optional shared store, with hit-rate counters."""
+
+    def __init__(self, memory_cache: EmbeddingLRUCache, store=None):
+        self.memory_cache = memory_cache
+        self.store = store
+        self._counters = {"requests": 0, "memory_hits": 0, "store_hits": 0, "misses": 0}
+        self._counters_lock = threading.Lock()
+
+    @property
+    def caches(self) -> bool:
+        """Whether embeddings are kept at all (EMBEDDING_CACHE_MAX_ENTRIES=0 and no store turns the cache off)."""
+
+        return self.store is not None or (self.memory_cache.max_entries > 0 and self.memory_cache.max_bytes > 0)
+
+    def _count(self, name, value=1):
+        with self._counters_lock:
+            self._counters[name] += value
+
+    def _lookup(self, key):
+        embedding = self.memory_cache.get(key)
+        if embedding is not None:
+            self._count("memory_hits")
+            return embedding
+
+        if self.store is not None:
+            try:
+                embedding = self.store.get(key)
+            except Exception as e:
+                logger.warning(f"Embedding store lookup failed: {e}")
+                embedding = None
+
+            if embedding is not None:
+                self._count("store_hits")
+                self.memory_cache.set(key, embedding)
+                return embedding
+
+        return None
+
+    def _save(self, key, embedding):
+        self.memory_cache.set(key, embedding)
+
+        if self.store is not None:
+            try:
+                self.store.set(key, embedding)
+            except Exception as e:
+                logger.warning(f"Embedding store write failed: {e}")
+
+    def _record_run_metadata(self, response, cached):
+        current_run = get_current_run_tree()
+        if current_run:
+            if response is not None:
+                current_run.metadata["usage_metadata"] = {
+                    "input_tokens": response.usage.prompt_tokens,
+                    "total_tokens": response.usage.total_tokens
+                }
+            current_run.metadata["embedding_cache"] = {"cached": cached, **self.stats()}
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            counters = dict(self._counters)
+
+        return {
+            **counters,
+            "hit_rate": 1 - counters["misses"] / counters["requests"] if counters["requests"] else 0.0,
+            "memory_entries": len(self.memory_cache),
+            "memory_bytes": self.memory_cache.size_bytes,
+        }
+
+    @traceable(
+        name="embed_query",
+        run_type="embedding",
+        metadata={"ls_provider": "openai", "ls_model_name": "text-embedding-3-small"}
+    )
+    def get_embedding(self, text, model="text-embedding-3-small", dimensions=None):
+        dimensions = config.EMBEDDING_DIMENSIONS if dimensions is None else dimensions
+        key = cache_key(model, text, dimensions)
+        self._count("requests")
+
+        embedding = self._lookup(key)
+        if embedding is not None:
+            self._record_run_metadata(None, cached=[True])
+            return embedding
+
+        self._count("misses")
+        response = get_openai_client().embeddings.create(
+            input=text,
+            model=model,
+            **dimensions_kwargs(dimensions)
+        )
+        embedding = response.data[0].embedding
+        self._save(key, embedding)
+        self._record_run_metadata(response, cached=[False])
+
+        return embedding
+
+    @traceable(
+        name="embed_query",
+        run_type="embedding",
+        metadata={"ls_provider": "openai", "ls_model_name": "text-embedding-3-small"}
+    )
+    async def aget_embeddings(self, texts, model="text-embedding-3-small", dimensions=None):
+        """Embed several texts, sending only the cache misses to OpenAI in one request."""
+
+        dimensions = config.EMBEDDING_DIMENSIONS if dimensions is None else dimensions
+        keys = [cache_key(model, text, dimensions) for text in texts]
+        self._count("requests", len(texts))
+
+        if self.store is not None:
+            embeddings = await asyncio.to_thread(lambda: [self._lookup(key) for key in keys])
+        else:
+            embeddings = [self._lookup(key) for key in keys]
+
+        cached = [embedding is not None for embedding in embeddings]
+
+        missing = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[i], []).append(i)
+
+        response = None
+        if missing:
+            # Per text, like requests; duplicates of one missing text are still embedded once
+            self._count("misses", cached.count(False))
+            response = await get_async_openai_client().embeddings.create(
+                input=[texts[positions[0]] for positions in missing.values()],
+                model=model,
+                **dimensions_kwargs(dimensions)
+            )
+
+            for (key, positions), item in zip(missing.items(), response.data):
+                for i in positions:
+                    embeddings[i] = item.embedding
+
+            if self.store is not None:
+                await asyncio.to_thread(lambda: [self._save(key, item.embedding) for key, item in zip(missing, response.data)])
+            else:
+                for key, item in zip(missing, response.data):
+                    self._save(key, item.embedding)
+
+        self._record_run_metadata(response, cached=cached)
+
+        return embeddings
+
+    async def aget_embedding(self, text, model="text-embedding-3-small", dimensions=None):
+        return (await self.aget_embeddings([text], model, dimensions))[0]
+
+
+def _build_store():
+    backend = config.EMBEDDING_CACHE_BACKEND
+
+    if not backend:
+        return None
+    if backend == "sqlite":
+        return SQLiteEmbeddingStore(config.EMBEDDING_CACHE_SQLITE_PATH, config.EMBEDDING_CACHE_TTL_SECONDS)
+    if backend == "redis":
+        return RedisEmbeddingStore(config.EMBEDDING_CACHE_REDIS_URL, config.EMBEDDING_CACHE_TTL_SECONDS)
+
+    raise ValueError(f"Unknown EMBEDDING_CACHE_BACKEND: {backend!r} (expected '', 'sqlite' or 'redis')")
+
+
+@lru_cache(maxsize=1)
+def get_embedding_service() -> EmbeddingService:
+    return EmbeddingService(
+        memory_cache=EmbeddingLRUCache(
+            max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES,
+            max_bytes=config.EMBEDDING_CACHE_MAX_BYTES
+        ),
+        store=_build_store()
+    )
@@ -0,0 +1,96 @@
+from typing import List
+
+from langchain_core.messages import convert_to_openai_messages
+
+from api.agents.utils.context_budget import count_tokens, truncate_tokens
+
+
+#### CONVERSATION VIEW ####
+def split_turns(messages: List[dict]) -> List[List[dict]]:
+    """Group OpenAI-format messages into turns, each starting at a user message."""
+
+    turns = []
+
+    for message in messages:
+        if message["role"] == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+
+    return turns
+
+
+def without_tool_output(turn: List[dict]) -> List[dict]:
+    """A finished turn as later turns need it: the question and the answer, without tool calls and their results."""
+
+    return [message for message in turn if message["role"] != "tool" and not message.get("tool_calls")]
+
+
+def message_tokens(messages: List[dict]) -> int:
+    return sum(count_tokens(str(message.get("content") or "")) for message in messages)
+
+
+def summary_message(summary: str) -> List[dict]:
+    return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] if summary else []
+
+
+def unsummarized_turns(state) -> List[List[dict]]:
+    return split_turns([convert_to_openai_messages(message) for message in state.messages[state.summarized_messages:]])
+
+
+def history_messages(state) -> List[dict]:
+    """The conversation as sent to the models: the summary of folded turns, the later finished turns
+    without tool output, and the current turn in full."""
+
+    turns = unsummarized_turns(state)
+
+    messages = summary_message(state.history_summary)
+    for turn in turns[:-1]:
+        messages.extend(without_tool_output(turn))
+    if turns:
+        messages.extend(turns[-1])
+
+    return messages
+
+
+def router_messages(state, context_turns: int, turn_max_tokens: int) -> List[dict]:
+    """A smaller view for the intent router: the summary, the question and answer of the last context_turns
+    finished turns, each cut to turn_max_tokens, and the current question."""
+
+    turns = unsummarized_turns(state)
+    finished, current = turns[:-1], turns[-1:]
+
+    messages = summary_message(state.history_summary)
+    for turn in (finished[-context_turns:] if context_turns else []):
+        for message in without_tool_output(turn):
+            content, _ = truncate_tokens(str(message.get("content") or ""), turn_max_tokens)
+            messages.append({"role": message["role"], "content": content})
+    if current:
+        messages.append(current[0][0])
+
+    return messages
+
+
+def turns_to_fold(state, window_turns: int, max_tokens: int) -> List[List[dict]]:
+    """The oldest finished turns to fold into the summary, if any.
+
+    Past window_turns finished turns (0 = no window), all but the latest half of the window are folded,
+    so the summary is updated every few turns rather than on every one. Further turns are folded while
+    the view exceeds max_tokens (0 = no limit).
+    """
+
+    turns = unsummarized_turns(state)
+    finished, current = turns[:-1], turns[-1:]
+
+    fold = 0
+    if window_turns and len(finished) > window_turns:
+        fold = len(finished) - window_turns // 2
+
+    if max_tokens:
+        sizes = [message_tokens(without_tool_output(turn)) for turn in finished]
+        fixed = message_tokens(summary_message(state.history_summary)) + sum(message_tokens(turn) for turn in current)
+
+        while fold < len(finished) and fixed + sum(sizes[fold:]) > max_tokens:
+            fold += 1
+
+    return finished[:fold]
@@ -0,0 +1,89 @@
+from langsmith import traceable
+from qdrant_client.models import Filter, FieldCondition, MatchAny
+import logging
+
+from api.core.config import config
+
+
+logger = logging.getLogger(__name__)
+
+# Everything _build_used_context reads; the rest of the item payload is never transferred
+REFERENCE_PAYLOAD_FIELDS = ["parent_asin", "image", "price"]
+
+
+#### REFERENCE HYDRATION ####
+def _reference_scroll_args(item_ids, collection_name):
+    return {
+        "collection_name": collection_name,
+        "scroll_filter": Filter(
+            must=[
+                FieldCondition(
+                    key="parent_asin",
+                    match=MatchAny(any=item_ids)
+                )
+            ]
+        ),
+        "limit": len(item_ids),
+        "with_payload": REFERENCE_PAYLOAD_FIELDS,
+        "with_vectors": False
+    }
+
+
+def _build_used_context(references, points):
+
+    payloads = {point.payload["parent_asin"]: point.payload for point in points}
+
+    used_context = []
+
+    for item in references:
+        payload = payloads.get(item.id)
+
+        if payload is None:
+            logger.warning(f"Missing parent_asin in Qdrant: {item.id}")
+            continue
+
+        image_url = payload.get('image', '')
+        price = payload.get('price', '')
+        if image_url:
+            used_context.append({
+                "description": item.description,
+                "image_url": image_url,
+                "price": price,
+                "id": item.id
+            })
+
+    return used_context
+
+
+@traceable(
+    name="hydrate_references",
+    run_type="retriever"
+)
+def hydrate_references(qdrant_client, references, collection_name=config.QDRANT_ITEMS_COLLECTION):
+    """Fetch the payloads of all referenced items in a single scroll and build the used context."""
+
+    item_ids = list(dict.fromkeys(item.id for item in references))
+
+    if not item_ids:
+        return []
+
+    points, _ = qdrant_client.scroll(**_reference_scroll_args(item_ids, collection_name))
+
+    return _build_used_context(references, points)
+
+
+@traceable(
+    name="hydrate_references",
+    run_type="retriever"
+)
+async def ahydrate_references(qdrant_client, references, collection_name=config.QDRANT_ITEMS_COLLECTION):
+    """Async variant of hydrate_references for use with AsyncQdrantClient."""
+
+    item_ids = list(dict.fromkeys(item.id for item in references))
+
+    if not item_ids:
+        return []
+
+    points, _ = await qdrant_client.scroll(**_reference_scroll_args(item_ids, collection_name))
+
+    return _build_used_context(references, points)
@@ -0,0 +1,32 @@
+from langsmith import traceable
+
+from api.agents.utils.embeddings import get_embedding_service
+from api.agents.utils.vector_search import ITEMS_SEARCH, dense_search_params
+from api.core.clients import get_async_qdrant_client
+
+
+#### LOCAL INTENT CLASSIFIER ####
+@traceable(
+    name="catalog_similarity",
+    run_type="retriever"
+)
+async def catalog_similarity(question: str) -> float:
+    """Cosine similarity between the question and the nearest item in the catalog.
+
+    A high score means the question is about products in stock. A low one is not conclusive
+    (follow-ups such as "and the cheaper one?" score low), so it only decides the clear cases.
+    """
+
+    embedding = await get_embedding_service().aget_embedding(question)
+
+    response = await get_async_qdrant_client().query_points(
+        collection_name=ITEMS_SEARCH.collection_name,
+        query=embedding,
+        using=ITEMS_SEARCH.dense_vector,
+        search_params=dense_search_params(),
+        limit=1,
+        with_payload=False,
+        with_vectors=False
+    )
+
+    return response.points[0].score if response.points else 0.0
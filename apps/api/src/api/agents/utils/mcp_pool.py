@@ -0,0 +1,153 @@
+import asyncio
+import itertools
+import logging
+from functools import lru_cache
+from typing import Dict, List
+
+from api.core.config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+#### MCP SESSION POOL ####
+class MCPServerPool:
+    """Long-lived streamable-HTTP sessions to one MCP server, opened once and shared by all requests.
+
+    Calls are spread round-robin over the sessions and limited to max_concurrency in flight. The tool
+    list is fetched when the sessions are opened and kept, so requests never call list_tools.
+    """
+
+    def __init__(self, name: str, url: str, sessions: int, max_concurrency: int, timeout: float):
+        self.name = name
+        self.url = url
+        self.sessions = max(1, sessions)
+        self.timeout = timeout
+        self.tool_names: List[str] = []
+        self._clients = []
+        self._next = itertools.count()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+
+    def _new_client(self):
+        try:
+            from fastmcp import Client
+        except ImportError as e:
+            raise ImportError(
+                "TOOL_TRANSPORT='mcp' needs fastmcp. Install the api package with the 'mcp' extra."
+            ) from e
+
+        return Client(self.url, timeout=self.timeout)
+
+    async def open(self):
+        """Open the missing sessions and discover the server's tools, if not done yet."""
+
+        async with self._lock:
+            while len(self._clients) < self.sessions:
+                client = self._new_client()
+                await client.__aenter__()
+                self._clients.append(client)
+
+            if not self.tool_names:
+                self.tool_names = [t.name for t in await self._clients[0].list_tools()]
+                logger.info(f"MCP server {self.name} at {self.url} serves {self.tool_names}")
+
+    async def _discard(self, client):
+        # A session that lost its connection is dropped and reopened on the next call
+        async with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        try:
+            await client.close()
+        except Exception:
+            logger.debug(f"Closing a broken session to MCP server {self.name} failed", exc_info=True)
+
+    async def call_tool(self, name: str, arguments: dict) -> str:
+        async with self._semaphore:
+            await self.open()
+            client = self._clients[next(self._next) % len(self._clients)]
+
+            try:
+                result = await asyncio.wait_for(client.call_tool_mcp(name, arguments), self.timeout)
+            except Exception:
+                if not client.is_connected():
+                    await self._discard(client)
+                raise
+
+        content = "".join(getattr(block, "text", "") for block in result.content)
+
+        if result.isError:
+            raise RuntimeError(f"MCP server {self.name} returned an error for {name}: {content}")
+
+        return content
+
+    async def close(self):
+        async with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            await client.close()
+
+
+class MCPToolTransport:
+    """Sends tool calls to the MCP server that serves the tool."""
+
+    def __init__(self, servers: Dict[str, MCPServerPool]):
+        self.servers = servers
+
+    async def open(self):
+        """Open every server's sessions. A server that is down is logged and retried on its first call."""
+
+        results = await asyncio.gather(*[server.open() for server in self.servers.values()], return_exceptions=True)
+
+        for server, result in zip(self.servers.values(), results):
+            if isinstance(result, Exception):
+                logger.warning(f"Could not open MCP server {server.name} at {server.url}: {result!r}")
+
+    async def server_for(self, tool_name: str, server: str = "") -> MCPServerPool:
+        """The server named in the tool call if it serves the tool, otherwise the first one that does."""
+
+        if server in self.servers:
+            candidates = [self.servers[server]] + [s for s in self.servers.values() if s.name != server]
+        else:
+            candidates = list(self.servers.values())
+
+        for candidate in candidates:
+            if not candidate.tool_names:
+                await candidate.open()
+            if tool_name in candidate.tool_names:
+                return candidate
+
+        raise ValueError(f"No MCP server serves {tool_name}")
+
+    async def call_tool(self, name: str, arguments: dict, server: str = "") -> str:
+        return await (await self.server_for(name, server)).call_tool(name, arguments)
+
+    async def close(self):
+        await asyncio.gather(*[server.close() for server in self.servers.values()], return_exceptions=True)
+
+
+@lru_cache(maxsize=1)
+def get_mcp_tool_transport() -> MCPToolTransport:
+    """Return the process-wide MCP tool transport; sessions open on MCPToolTransport.open() or the first call."""
+
+    servers = {
+        "items": config.MCP_ITEMS_SERVER_URL,
+        "reviews": config.MCP_REVIEWS_SERVER_URL,
+    }
+
+    return MCPToolTransport({
+        name: MCPServerPool(
+            name,
+            url,
+            sessions=config.MCP_SESSIONS_PER_SERVER,
+            max_concurrency=config.MCP_MAX_CONCURRENCY_PER_SERVER,
+            timeout=config.MCP_TIMEOUT_SECONDS,
+        )
+        for name, url in servers.items() if url
+    })
+
+
+async def close_mcp_tool_transport():
+    if get_mcp_tool_transport.cache_info().currsize:
+        await get_mcp_tool_transport().close()
+        get_mcp_tool_transport.cache_clear()
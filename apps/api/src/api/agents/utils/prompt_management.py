@@ -1,26 +1,88 @@
+from pathlib import Path
+import threading
+import time
+
 import yaml
 from jinja2 import Template
 from langsmith import Client
 
+from api.core.config import config
+
 
 ls_client = Client()
 
-def prompt_template_config(yaml_file, prompt_key):
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
 
-    with open(yaml_file, "r") as file:
-        config = yaml.safe_load(file)
 
-    template_content = config["prompts"][prompt_key]
+#### LOCAL PROMPT REGISTRY ####
+class PromptRegistry:
+    """Compiled Jinja templates for every prompt in a directory of YAML files.
 
-    template = Template(template_content)
+    All files are parsed once. With hot_reload on, files whose mtime changed are re-read on lookup.
+    """
 
-    return template
+    def __init__(self, prompts_dir: Path, hot_reload: bool = False):
+        self.prompts_dir = Path(prompts_dir)
+        self.hot_reload = hot_reload
+        self._templates = {}
+        self._mtimes = {}
+        self._lock = threading.Lock()
+
+        for path in sorted(self.prompts_dir.glob("*.yaml")):
+            self._load_file(path)
+
+    def _load_file(self, path: Path):
+        mtime = path.stat().st_mtime
+
+        with open(path, "r") as file:
+            prompt_config = yaml.safe_load(file)
+
+        for prompt_key, template_content in prompt_config["prompts"].items():
+            self._templates[prompt_key] = Template(template_content)
+
+        self._mtimes[path] = mtime
+
+    def _reload_changed(self):
+        with self._lock:
+            for path in sorted(self.prompts_dir.glob("*.yaml")):
+                if self._mtimes.get(path) != path.stat().st_mtime:
+                    self._load_file(path)
+
+    def get(self, prompt_key: str) -> Template:
+        if self.hot_reload:
+            self._reload_changed()
+
+        return self._templates[prompt_key]
+
+
+prompt_registry = PromptRegistry(PROMPTS_DIR, hot_reload=config.PROMPT_HOT_RELOAD)
+
+
+def get_prompt_template(prompt_key):
+
+    return prompt_registry.get(prompt_key)
+
+
+#### LANGSMITH PROMPT REGISTRY ####
+_registry_templates = {}
+_registry_lock = threading.Lock()
 
 
 def prompt_template_registry(prompt_name):
 
+    now = time.monotonic()
+
+    with _registry_lock:
+        cached = _registry_templates.get(prompt_name)
+
+    if cached and cached[0] > now:
+        return cached[1]
+
     template_content = ls_client.pull_prompt(prompt_name).messages[0].prompt.template
 
     template = Template(template_content)
 
-    return template
\ No newline at end of file
+    with _registry_lock:
+        _registry_templates[prompt_name] = (now + config.PROMPT_REGISTRY_TTL_SECONDS, template)
+
+    return template
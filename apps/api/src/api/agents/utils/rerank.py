@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from dataclasses import replace
+from functools import lru_cache
+from typing import List, Optional
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+
+from fastembed.rerank.cross_encoder import TextCrossEncoder
+from langsmith import traceable, get_current_run_tree
+
+from api.agents.utils.embeddings import normalize_text
+from api.agents.utils.vector_search import RetrievedChunk
+from api.core.config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+#### BACKENDS ####
+class FastEmbedRerankBackend:
+    """Local CPU cross-encoder (ONNX via fastembed). The model is downloaded and loaded on first use."""
+
+    default_model = "Xenova/ms-marco-MiniLM-L-6-v2"
+
+    def __init__(self, model: str = ""):
+        self.model = model or self.default_model
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+
+    def _get_encoder(self):
+        with self._encoder_lock:
+            if self._encoder is None:
+                self._encoder = TextCrossEncoder(model_name=self.model)
+
+        return self._encoder
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        # Inference is CPU bound; keep it off the event loop
+        return await asyncio.to_thread(
+            lambda: [float(score) for score in self._get_encoder().rerank(query, documents, batch_size=len(documents))]
+        )
+
+
+class CohereRerankBackend:
+    """Cohere's hosted rerank API."""
+
+    default_model = "rerank-v4.0-fast"
+
+    def __init__(self, model: str = ""):
+        import cohere
+
+        self.model = model or self.default_model
+        self._client = cohere.AsyncClientV2(api_key=config.CO_API_KEY or None)
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        response = await self._client.rerank(model=self.model, query=query, documents=documents, top_n=len(documents))
+
+        scores = [0.0] * len(documents)
+        for result in response.results:
+            scores[result.index] = result.relevance_score
+
+        return scores
+
+
+class StubRerankBackend:
+    """Offline stand-in for a remote reranker: the fraction of query terms found in the document.
+    Needs no model or network, for local development and pipeline tests."""
+
+    default_model = "term-overlap"
+
+    def __init__(self, model: str = ""):
+        self.model = model or self.default_model
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        terms = set(re.findall(r"\w+", normalize_text(query)))
+
+        return [
+            len(terms & set(re.findall(r"\w+", normalize_text(document)))) / (len(terms) or 1)
+            for document in documents
+        ]
+
+
+RERANK_BACKENDS = {
+    "fastembed": FastEmbedRerankBackend,
+    "cohere": CohereRerankBackend,
+    "stub": StubRerankBackend
+}
+
+
+#### RERANKER ####
+class Reranker:
+    """Rescores fused candidates with a reranking backend and keeps the best.
+
+    Callers fetch candidates(k) chunks and pass them to rerank(), which returns at most top_n(k).
+    Scores are cached per (model, query, document text) and uncached ones are scored in batches.
+    """
+
+    def __init__(self, backend, batch_size: int, overfetch_factor: float, max_results: int, cache_max_entries: int):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.overfetch_factor = overfetch_factor
+        self.max_results = max_results
+        self.cache_max_entries = cache_max_entries
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def candidates(self, k: int) -> int:
+        return max(k, math.ceil(k * self.overfetch_factor))
+
+    def top_n(self, k: int) -> int:
+        return min(k, self.max_results) if self.max_results else k
+
+    def _key(self, query: str, text: str) -> str:
+        return hashlib.sha256(f"{self.backend.model}\x00{normalize_text(query)}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _cached_scores(self, keys):
+        with self._cache_lock:
+            scores = {}
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+            return scores
+
+    def _store_scores(self, scores: dict):
+        with self._cache_lock:
+            self._cache.update(scores)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    @traceable(
+        name="rerank",
+        run_type="retriever"
+    )
+    async def rerank(self, query: str, chunks: List[RetrievedChunk], k: int) -> List[RetrievedChunk]:
+        top_n = self.top_n(k)
+        started = time.perf_counter()
+
+        keys = [self._key(query, chunk.text) for chunk in chunks]
+        scores = self._cached_scores(keys)
+        cache_hits = len(scores)
+
+        # Duplicate texts (e.g. the same review under two items) are scored once
+        missing = {key: chunk.text for key, chunk in zip(keys, chunks) if key not in scores}
+        batches = [list(missing.items())[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+
+        try:
+            results = await asyncio.gather(*(self.backend.score(query, [text for _, text in batch]) for batch in batches))
+        except Exception as e:
+            logger.warning(f"Reranking failed, keeping fusion order: {e}")
+            return chunks[:top_n]
+
+        fresh = {key: score for batch, batch_scores in zip(batches, results) for (key, _), score in zip(batch, batch_scores)}
+        self._store_scores(fresh)
+        scores.update(fresh)
+
+        ranked = sorted(zip(chunks, keys), key=lambda pair: scores[pair[1]], reverse=True)[:top_n]
+
+        current_run = get_current_run_tree()
+        if current_run:
+            current_run.metadata["rerank"] = {
+                "model": self.backend.model,
+                "candidates": len(chunks),
+                "returned": len(ranked),
+                "cache_hits": cache_hits,
+                "batches": len(batches),
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2)
+            }
+
+        return [replace(chunk, score=scores[key]) for chunk, key in ranked]
+
+
+@lru_cache(maxsize=1)
+def get_reranker() -> Optional[Reranker]:
+    """The configured reranker, or None when RERANK_BACKEND is empty."""
+
+    backend = config.RERANK_BACKEND
+
+    if not backend:
+        return None
+    if backend not in RERANK_BACKENDS:
+        raise ValueError(f"Unknown RERANK_BACKEND: {backend!r} (expected '', 'fastembed', 'cohere' or 'stub')")
+
+    return Reranker(
+        backend=RERANK_BACKENDS[backend](config.RERANK_MODEL),
+        batch_size=config.RERANK_BATCH_SIZE,
+        overfetch_factor=config.RERANK_OVERFETCH_FACTOR,
+        max_results=config.RERANK_MAX_RESULTS,
+        cache_max_entries=config.RERANK_CACHE_MAX_ENTRIES
+    )
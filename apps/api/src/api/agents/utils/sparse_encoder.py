@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import logging
+import threading
+import time
+
+from fastembed import SparseTextEmbedding
+from langsmith import traceable, get_current_run_tree
+from qdrant_client.models import SparseVector
+
+from api.core.config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+#### BM25 QUERY ENCODER ####
+class SparseQueryEncoder:
+    """Client-side sparse (BM25) query encoding with an LRU of encoded queries.
+
+    The model is loaded by load(), called at startup, or on the first query otherwise.
+    BM25 lowercases and splits on whitespace, so queries differing only in case or spacing share an entry.
+    Async callers use aencode(), which runs model loading and encoding in a worker thread.
+    """
+
+    def __init__(self, model_name: str, max_entries: int):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.load_seconds = None
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "hits": 0, "encode_seconds": 0.0}
+
+    def load(self) -> SparseTextEmbedding:
+        with self._model_lock:
+            if self._model is None:
+                started = time.perf_counter()
+                self._model = SparseTextEmbedding(model_name=self.model_name)
+                # The first query also builds the tokenizer and stemmer state
+                list(self._model.query_embed("warm up"))
+                self.load_seconds = time.perf_counter() - started
+                logger.info(f"Loaded sparse encoder {self.model_name} in {self.load_seconds:.2f}s")
+
+        return self._model
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+
+        misses = counters["requests"] - counters["hits"]
+
+        return {
+            **counters,
+            "hit_rate": counters["hits"] / counters["requests"] if counters["requests"] else 0.0,
+            "mean_encode_ms": 1000 * counters["encode_seconds"] / misses if misses else 0.0,
+            "entries": entries,
+            "load_seconds": self.load_seconds,
+        }
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    async def aencode(self, text: str) -> SparseVector:
+        """encode() that keeps the event loop free; only cache hits on a loaded model run inline."""
+
+        with self._lock:
+            cached = self._model is not None and self._key(text) in self._entries
+
+        if cached:
+            return self.encode(text)
+
+        return await asyncio.to_thread(self.encode, text)
+
+    @traceable(
+        name="encode_sparse_query",
+        run_type="embedding"
+    )
+    def encode(self, text: str) -> SparseVector:
+        key = self._key(text)
+
+        with self._lock:
+            self._counters["requests"] += 1
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+
+        encode_seconds = None
+        if vector is None:
+            started = time.perf_counter()
+            embedding = next(iter(self.load().query_embed(key)))
+            vector = SparseVector(indices=embedding.indices.tolist(), values=embedding.values.tolist())
+            encode_seconds = time.perf_counter() - started
+
+            with self._lock:
+                self._counters["encode_seconds"] += encode_seconds
+                self._entries[key] = vector
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        current_run = get_current_run_tree()
+        if current_run:
+            current_run.metadata["sparse_encoder"] = {
+                "model": self.model_name,
+                "cached": encode_seconds is None,
+                "encode_ms": 1000 * encode_seconds if encode_seconds is not None else None,
+                **self.stats()
+            }
+
+        return vector
+
+
+@lru_cache(maxsize=None)
+def get_sparse_encoder(model_name: str = "Qdrant/bm25") -> SparseQueryEncoder:
+    return SparseQueryEncoder(model_name, config.SPARSE_QUERY_CACHE_MAX_ENTRIES)
@@ -43,7 +43,7 @@ def parse_function_definition(function_def: str) -> Dict[str, Any]:
 
     # Parse the function using AST
     tree = ast.parse(function_def.strip())
-    if not tree.body or not isinstance(tree.body[0], ast.FunctionDef):
+    if not tree.body or not isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef)):
         return result
 
     func = tree.body[0]
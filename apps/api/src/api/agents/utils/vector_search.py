@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+from typing import List, Optional
+import math
+
+from qdrant_client import models
+from qdrant_client.models import Fusion, FusionQuery, Prefetch, QuantizationSearchParams, SearchParams
+
+from api.agents.utils.sparse_encoder import get_sparse_encoder
+from api.core.config import config
+
+
+def dense_search_params(oversampling=None, rescore=None) -> SearchParams:
+    """Search params for dense queries: with a quantized collection, oversample candidates and rescore
+    them with the original vectors. Ignored by collections without quantization."""
+
+    return SearchParams(
+        quantization=QuantizationSearchParams(
+            rescore=config.QDRANT_QUANTIZATION_RESCORE if rescore is None else rescore,
+            oversampling=config.QDRANT_QUANTIZATION_OVERSAMPLING if oversampling is None else oversampling
+        )
+    )
+
+
+@dataclass(slots=True)
+class RetrievedChunk:
+    id: str
+    text: str
+    score: float
+    rating: Optional[float] = None
+
+
+#### HYBRID RETRIEVAL ENGINE ####
+@dataclass
+class HybridSearch:
+    """A dense (plus optional BM25) query against one collection, fused server-side.
+
+    Each branch fetches max(prefetch_min, k * prefetch_factor) candidates, optionally cut at a score
+    threshold. Fusion is "rrf", "dbsf" or "weighted" (dense_weight * dense score + sparse_weight * BM25
+    score). Only the id, text and rating payload fields are transferred.
+    """
+
+    collection_name: str
+    text_field: str
+    dense_vector: Optional[str] = "text-embedding-3-small"  # None for an unnamed vector
+    sparse_vector: Optional[str] = None
+    sparse_model: str = "Qdrant/bm25"
+    id_field: str = "parent_asin"
+    rating_field: Optional[str] = None
+    fusion: str = config.RETRIEVAL_FUSION
+    prefetch_factor: float = config.RETRIEVAL_PREFETCH_FACTOR
+    prefetch_min: int = config.RETRIEVAL_PREFETCH_MIN
+    dense_score_threshold: Optional[float] = config.RETRIEVAL_DENSE_SCORE_THRESHOLD or None
+    sparse_score_threshold: Optional[float] = config.RETRIEVAL_SPARSE_SCORE_THRESHOLD or None
+    dense_weight: float = config.RETRIEVAL_DENSE_WEIGHT
+    sparse_weight: float = config.RETRIEVAL_SPARSE_WEIGHT
+
+    def prefetch_limit(self, k: int) -> int:
+        return max(self.prefetch_min, math.ceil(k * self.prefetch_factor))
+
+    def payload_fields(self) -> List[str]:
+        return [field for field in (self.id_field, self.text_field, self.rating_field) if field]
+
+    def _fusion_query(self):
+        if self.fusion == "rrf":
+            return FusionQuery(fusion=Fusion.RRF)
+        if self.fusion == "dbsf":
+            return FusionQuery(fusion=Fusion.DBSF)
+        if self.fusion == "weighted":
+            # $score[i] is the score from the i-th prefetch; points found by one branch only score 0 in the other
+            return models.FormulaQuery(
+                formula=models.SumExpression(sum=[
+                    models.MultExpression(mult=[self.dense_weight, "$score[0]"]),
+                    models.MultExpression(mult=[self.sparse_weight, "$score[1]"])
+                ]),
+                defaults={"$score[0]": 0.0, "$score[1]": 0.0}
+            )
+
+        raise ValueError(f"Unknown fusion: {self.fusion!r} (expected 'rrf', 'dbsf' or 'weighted')")
+
+    def query_args(self, query_text: str, query_embedding, k: int, query_filter=None, search_params=None, sparse_query=None) -> dict:
+        """Arguments for query_points; shared by the sync and async clients.
+
+        `sparse_query` is the already encoded BM25 query; without it the query text is encoded here.
+        """
+
+        search_params = search_params or dense_search_params()
+        args = {
+            "collection_name": self.collection_name,
+            "limit": k,
+            "with_payload": self.payload_fields(),
+            "with_vectors": False
+        }
+
+        if not self.sparse_vector:
+            return {
+                **args,
+                "query": query_embedding,
+                "using": self.dense_vector,
+                "query_filter": query_filter,
+                "score_threshold": self.dense_score_threshold,
+                "search_params": search_params
+            }
+
+        prefetch_limit = self.prefetch_limit(k)
+
+        return {
+            **args,
+            "prefetch": [
+                Prefetch(
+                    query=query_embedding,
+                    using=self.dense_vector,
+                    filter=query_filter,
+                    params=search_params,
+                    score_threshold=self.dense_score_threshold,
+                    limit=prefetch_limit
+                ),
+                Prefetch(
+                    query=sparse_query or get_sparse_encoder(self.sparse_model).encode(query_text),
+                    using=self.sparse_vector,
+                    filter=query_filter,
+                    score_threshold=self.sparse_score_threshold,
+                    limit=prefetch_limit
+                )
+            ],
+            "query": self._fusion_query()
+        }
+
+    def parse(self, points) -> List[RetrievedChunk]:
+        return [
+            RetrievedChunk(
+                id=point.payload[self.id_field],
+                text=point.payload[self.text_field],
+                score=point.score,
+                rating=point.payload.get(self.rating_field) if self.rating_field else None
+            )
+            for point in points
+        ]
+
+    def search(self, qdrant_client, query_text: str, query_embedding, k: int, **kwargs) -> List[RetrievedChunk]:
+        response = qdrant_client.query_points(**self.query_args(query_text, query_embedding, k, **kwargs))
+        return self.parse(response.points)
+
+    async def asearch(self, qdrant_client, query_text: str, query_embedding, k: int, **kwargs) -> List[RetrievedChunk]:
+        if self.sparse_vector:
+            # BM25 encoding is CPU work and may load the model; keep it off the event loop
+            kwargs["sparse_query"] = await get_sparse_encoder(self.sparse_model).aencode(query_text)
+
+        response = await qdrant_client.query_points(**self.query_args(query_text, query_embedding, k, **kwargs))
+        return self.parse(response.points)
+
+
+ITEMS_SEARCH = HybridSearch(
+    collection_name=config.QDRANT_ITEMS_COLLECTION,
+    text_field="description",
+    sparse_vector="bm25",
+    rating_field="average_rating"
+)
+
+REVIEWS_SEARCH = HybridSearch(
+    collection_name=config.QDRANT_REVIEWS_COLLECTION,
+    text_field="text",
+    dense_vector=None
+)
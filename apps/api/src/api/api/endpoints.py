@@ -17,7 +17,7 @@ rag_router = APIRouter()
 feedback_router = APIRouter()
 
 @rag_router.post("/")
-def rag(
+async def rag(
     request: Request,
     payload: RAGRequest
 ) -> StreamingResponse:
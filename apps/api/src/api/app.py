@@ -3,7 +3,24 @@ from starlette.middleware.cors import CORSMiddleware
 from api.api.middleware import RequestIdMiddleware
 
 from api.api.endpoints import api_router
+from api.agents.graph import get_graph
+from api.agents.tools import get_available_tools
+from api.agents.utils.sparse_encoder import get_sparse_encoder
+from api.agents.utils.vector_search import ITEMS_SEARCH
+from api.agents.utils.mcp_pool import get_mcp_tool_transport, close_mcp_tool_transport
+from api.core.config import config
+from api.core.clients import (
+    get_async_qdrant_client,
+    get_async_postgres_pool,
+    close_qdrant_client,
+    close_async_qdrant_client,
+    close_openai_client,
+    close_async_openai_client,
+    close_async_postgres_pool,
+)
 
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 logging.basicConfig(
@@ -12,7 +29,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_async_qdrant_client()
+    await get_async_postgres_pool().open()
+    get_graph()
+    get_available_tools()
+    if config.SPARSE_ENCODER_PRELOAD and ITEMS_SEARCH.sparse_vector:
+        await asyncio.to_thread(get_sparse_encoder(ITEMS_SEARCH.sparse_model).load)
+    if config.TOOL_TRANSPORT == "mcp":
+        await get_mcp_tool_transport().open()
+    yield
+    get_graph.cache_clear()
+    await close_mcp_tool_transport()
+    await close_async_postgres_pool()
+    await close_async_openai_client()
+    close_openai_client()
+    await close_async_qdrant_client()
+    close_qdrant_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(RequestIdMiddleware)
 
@@ -0,0 +1,120 @@
+from functools import lru_cache
+import logging
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from api.core.config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+#### QDRANT CLIENTS ####
+def _qdrant_client_options() -> dict:
+    return {
+        "url": config.QDRANT_URL,
+        "grpc_port": config.QDRANT_GRPC_PORT,
+        "prefer_grpc": config.QDRANT_PREFER_GRPC,
+        "timeout": config.QDRANT_TIMEOUT,
+        "grpc_options": {
+            "grpc.keepalive_time_ms": int(config.QDRANT_KEEPALIVE_EXPIRY * 1000),
+            "grpc.keepalive_permit_without_calls": 1,
+        },
+        "limits": httpx.Limits(
+            max_connections=config.QDRANT_POOL_SIZE,
+            max_keepalive_connections=config.QDRANT_POOL_SIZE,
+            keepalive_expiry=config.QDRANT_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_qdrant_client() -> QdrantClient:
+    """Return the process-wide Qdrant client, creating it on first use."""
+
+    logger.info(f"Creating Qdrant client for {config.QDRANT_URL} (prefer_grpc={config.QDRANT_PREFER_GRPC})")
+
+    return QdrantClient(**_qdrant_client_options())
+
+
+def close_qdrant_client():
+    """Close the shared Qdrant client so the next call to get_qdrant_client builds a fresh one."""
+
+    if get_qdrant_client.cache_info().currsize:
+        get_qdrant_client().close()
+        get_qdrant_client.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Return the process-wide async Qdrant client used on the request path."""
+
+    logger.info(f"Creating async Qdrant client for {config.QDRANT_URL} (prefer_grpc={config.QDRANT_PREFER_GRPC})")
+
+    return AsyncQdrantClient(**_qdrant_client_options())
+
+
+async def close_async_qdrant_client():
+    if get_async_qdrant_client.cache_info().currsize:
+        await get_async_qdrant_client().close()
+        get_async_qdrant_client.cache_clear()
+
+
+#### OPENAI CLIENTS ####
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """Return the process-wide OpenAI client for the sync code paths."""
+
+    return OpenAI(api_key=config.OPENAI_API_KEY, timeout=config.OPENAI_TIMEOUT)
+
+
+def close_openai_client():
+    if get_openai_client.cache_info().currsize:
+        get_openai_client().close()
+        get_openai_client.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def get_async_openai_client() -> AsyncOpenAI:
+    """Return the process-wide async OpenAI client so LLM and embedding calls reuse its connection pool."""
+
+    return AsyncOpenAI(api_key=config.OPENAI_API_KEY, timeout=config.OPENAI_TIMEOUT)
+
+
+async def close_async_openai_client():
+    if get_async_openai_client.cache_info().currsize:
+        await get_async_openai_client().close()
+        get_async_openai_client.cache_clear()
+
+
+#### POSTGRES CONNECTION POOL ####
+@lru_cache(maxsize=1)
+def get_async_postgres_pool() -> AsyncConnectionPool:
+    """Return the process-wide Postgres pool used by the LangGraph checkpointer.
+
+    The pool is created closed; open it from a running event loop (the app lifespan does this).
+    """
+
+    logger.info(f"Creating Postgres pool (min_size={config.POSTGRES_POOL_MIN_SIZE}, max_size={config.POSTGRES_POOL_MAX_SIZE})")
+
+    return AsyncConnectionPool(
+        conninfo=config.POSTGRES_URL,
+        min_size=config.POSTGRES_POOL_MIN_SIZE,
+        max_size=config.POSTGRES_POOL_MAX_SIZE,
+        kwargs={
+            "autocommit": True,
+            "prepare_threshold": 0,
+            "row_factory": dict_row,
+        },
+        open=False,
+    )
+
+
+async def close_async_postgres_pool():
+    if get_async_postgres_pool.cache_info().currsize:
+        await get_async_postgres_pool().close()
+        get_async_postgres_pool.cache_clear()
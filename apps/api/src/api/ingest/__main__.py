@@ -0,0 +1,76 @@
+"""Ingest a JSONL dataset into Qdrant.
+
+    python -m api.ingest items data/meta_Electronics.jsonl
+    python -m api.ingest reviews data/Electronics.jsonl --items-file data/meta_Electronics.jsonl
+    python -m api.ingest items data/meta_Electronics.jsonl --reindex
+
+Interrupted runs resume from their checkpoint file; pass --restart to start over.
+An existing collection must match --dimensions and --quantization; --recreate deletes and rebuilds it.
+With --reindex a new generation of the collection is built next to the serving one, reusing the vectors
+of unchanged records, and the serving alias is switched to it at the end.
+"""
+import argparse
+import asyncio
+import logging
+
+from api.core.clients import close_async_openai_client, close_async_qdrant_client, get_async_qdrant_client
+from api.core.config import config
+from api.ingest.pipeline import DATASETS, ingest, parent_asins_from
+from api.ingest.reindex import reindex
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m api.ingest", description="Stream a JSONL dataset into a Qdrant collection.")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("path", help="JSONL file, one record per line")
+    parser.add_argument("--collection", help="target collection, or alias with --reindex (defaults to the one the API queries)")
+    parser.add_argument("--batch-size", type=int, default=100, help="records per embedding request and upsert")
+    parser.add_argument("--concurrency", type=int, default=4, help="batches embedded and upserted in parallel")
+    parser.add_argument("--checkpoint", help="checkpoint file (defaults to <path>.<collection>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--items-file", help="only ingest reviews of items listed in this items JSONL file")
+    parser.add_argument("--dimensions", type=int, default=config.EMBEDDING_DIMENSIONS, help="Matryoshka-truncated embedding size (0 = full 1536)")
+    parser.add_argument("--quantization", choices=["", "scalar", "binary"], default="", help="quantization of a newly created collection")
+    parser.add_argument("--recreate", action="store_true", help="delete the target collection first and ingest from the start")
+    parser.add_argument("--reindex", action="store_true", help="build a new generation and switch the alias to it")
+    parser.add_argument("--replace-collection", action="store_true", help="with --reindex, replace a plain collection that has the alias name")
+    return parser.parse_args()
+
+
+async def main(args):
+    spec = DATASETS[args.dataset]
+
+    keep_row = None
+    if args.items_file:
+        parent_asins = parent_asins_from(args.items_file)
+        keep_row = lambda row: row.get("parent_asin") in parent_asins
+
+    options = {
+        "batch_size": args.batch_size,
+        "concurrency": args.concurrency,
+        "checkpoint_path": args.checkpoint,
+        "restart": args.restart,
+        "keep_row": keep_row,
+        "dimensions": args.dimensions,
+        "quantization": args.quantization,
+        "recreate": args.recreate
+    }
+
+    try:
+        if args.reindex:
+            await reindex(get_async_qdrant_client(), spec, args.path, alias=args.collection, replace_collection=args.replace_collection, **options)
+        else:
+            await ingest(get_async_qdrant_client(), spec, args.path, collection_name=args.collection, **options)
+    finally:
+        await close_async_openai_client()
+        await close_async_qdrant_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
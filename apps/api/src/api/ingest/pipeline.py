@@ -0,0 +1,541 @@
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+import openai
+import tiktoken
+from fastembed import SparseTextEmbedding
+from qdrant_client import models
+from qdrant_client.models import (
+    BinaryQuantization, BinaryQuantizationConfig, Distance, FieldCondition, Filter, FilterSelector, HasIdCondition,
+    MatchAny, PayloadSchemaType, PointStruct, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    SparseVectorParams, VectorParams
+)
+
+from api.agents.utils.embeddings import dimensions_kwargs
+from api.core.clients import get_async_openai_client
+from api.core.config import config
+
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_SIZE = 1536
+EMBEDDING_MAX_TOKENS = 8191
+SPARSE_MODEL = "Qdrant/bm25"
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+#### DATASETS ####
+@dataclass
+class DatasetSpec:
+    """How one JSONL dataset maps onto a Qdrant collection."""
+
+    name: str
+    collection_name: str
+    build_record: Callable[[dict], Optional[tuple]]  # JSON row -> (text to embed, payload), or None to skip
+    text_field: str  # payload field holding the embedded text
+    dense_vector_name: Optional[str]  # None for an unnamed dense vector
+    sparse_vector_name: Optional[str] = None
+    payload_indexes: list = field(default_factory=list)
+
+    def vectors_config(self, size: int = EMBEDDING_SIZE, on_disk: bool = False):
+        params = VectorParams(size=size, distance=Distance.COSINE, on_disk=on_disk or None)
+        return {self.dense_vector_name: params} if self.dense_vector_name else params
+
+    def dense_size(self, collection_info) -> int:
+        vectors = collection_info.config.params.vectors
+        return (vectors[self.dense_vector_name] if self.dense_vector_name else vectors).size
+
+    def sparse_vectors_config(self):
+        if not self.sparse_vector_name:
+            return None
+        return {self.sparse_vector_name: SparseVectorParams(modifier=models.Modifier.IDF)}
+
+
+def build_item_record(row):
+    description = f"{row['title']}. {''.join(row['features'])} "
+    images = row.get("images") or [{}]
+
+    return description, {
+        "description": description,
+        "image": images[0].get("large", ""),
+        "rating_number": row.get("rating_number"),
+        "price": row.get("price"),
+        "average_rating": row.get("average_rating"),
+        "parent_asin": row["parent_asin"]
+    }
+
+
+def build_review_record(row):
+    text = f"{row['title']} {row['text']}"
+
+    return text, {
+        "text": text,
+        "parent_asin": row["parent_asin"]
+    }
+
+
+ITEMS = DatasetSpec(
+    name="items",
+    collection_name=config.QDRANT_ITEMS_COLLECTION,
+    build_record=build_item_record,
+    text_field="description",
+    dense_vector_name=EMBEDDING_MODEL,
+    sparse_vector_name="bm25",
+    payload_indexes=["parent_asin", "content_hash"]
+)
+
+REVIEWS = DatasetSpec(
+    name="reviews",
+    collection_name=config.QDRANT_REVIEWS_COLLECTION,
+    build_record=build_review_record,
+    text_field="text",
+    dense_vector_name=None,
+    payload_indexes=["parent_asin", "content_hash"]
+)
+
+DATASETS = {spec.name: spec for spec in (ITEMS, REVIEWS)}
+
+
+def quantization_config(quantization: str):
+    """Qdrant quantization for "scalar" (int8, 4x smaller) or "binary" (1 bit, 32x smaller); "" for none."""
+
+    if not quantization:
+        return None
+    if quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+
+    raise ValueError(f"Unknown quantization: {quantization!r} (expected '', 'scalar' or 'binary')")
+
+
+def collection_quantization(collection_info) -> str:
+    """The quantization_config() name of an existing collection's quantization."""
+
+    quantization = collection_info.config.quantization_config
+    if quantization is None:
+        return ""
+
+    return "scalar" if getattr(quantization, "scalar", None) else "binary"
+
+
+#### CHECKPOINT ####
+class Checkpoint:
+    """Byte offset and next point id of the last contiguous batch acknowledged by Qdrant, kept in a JSON file."""
+
+    def __init__(self, path: str, extra: Optional[dict] = None):
+        self.path = path
+        self.extra = extra or {}
+
+    def load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {"offset": 0, "next_id": 1}
+
+        with open(self.path, "r") as file:
+            return json.load(file)
+
+    def save(self, offset: int, next_id: int):
+        tmp_path = f"{self.path}.tmp"
+
+        with open(tmp_path, "w") as file:
+            json.dump({**self.extra, "offset": offset, "next_id": next_id}, file)
+
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@dataclass
+class Batch:
+    seq: int
+    end_offset: int
+    next_id: int
+    ids: list = field(default_factory=list)
+    texts: list = field(default_factory=list)
+    payloads: list = field(default_factory=list)
+
+
+def read_batches(path: str, spec: DatasetSpec, batch_size: int, start_offset: int, first_id: int, keep_row=None, token_counter=None):
+    """Yield batches of records from a JSONL file, one line at a time, starting at a byte offset."""
+
+    seq = 0
+    next_id = first_id
+    batch = Batch(seq, start_offset, next_id)
+
+    with open(path, "rb") as file:
+        file.seek(start_offset)
+
+        for line in iter(file.readline, b""):
+            # Every line gets an id, skipped or not, so ids stay tied to line positions across resumes
+            line_id = next_id
+            next_id += 1
+
+            if not line.strip():
+                continue
+
+            row = json.loads(line)
+            if keep_row is not None and not keep_row(row):
+                continue
+
+            record = spec.build_record(row)
+            if record is None:
+                continue
+
+            text, payload = record
+            if token_counter is not None and token_counter(text) > EMBEDDING_MAX_TOKENS:
+                logger.warning(f"Skipping line {line_id}: text exceeds {EMBEDDING_MAX_TOKENS} tokens")
+                continue
+
+            batch.ids.append(line_id)
+            batch.texts.append(text)
+            batch.payloads.append(payload)
+
+            if len(batch.texts) >= batch_size:
+                batch.end_offset, batch.next_id = file.tell(), next_id
+                yield batch
+                seq += 1
+                batch = Batch(seq, file.tell(), next_id)
+
+        batch.end_offset, batch.next_id = file.tell(), next_id
+        yield batch
+
+
+#### PIPELINE ####
+def _token_counter():
+    encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _sparse_encoder():
+    return SparseTextEmbedding(model_name=SPARSE_MODEL)
+
+
+async def embed_with_backoff(texts, dimensions: int = 0, max_retries: int = 6, base_delay: float = 1.0):
+    """Embed a batch, backing off exponentially (with jitter) on rate limits and transient errors."""
+
+    for attempt in range(max_retries + 1):
+        try:
+            response = await get_async_openai_client().embeddings.create(
+                input=texts,
+                model=EMBEDDING_MODEL,
+                **dimensions_kwargs(dimensions)
+            )
+            return [item.embedding for item in response.data]
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = base_delay * 2 ** attempt * (0.5 + random.random())
+            logger.warning(f"Embedding request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def ensure_collection(
+    qdrant_client,
+    spec: DatasetSpec,
+    collection_name: str,
+    dimensions: int = 0,
+    quantization: str = "",
+    recreate: bool = False
+):
+    """Create the collection if needed. An existing one must match `dimensions` and `quantization`,
+    unless `recreate` deletes it first, and gets the payload indexes it is missing."""
+
+    exists = await qdrant_client.collection_exists(collection_name)
+
+    if exists and recreate:
+        logger.info(f"Deleting collection {collection_name} to recreate it")
+        await qdrant_client.delete_collection(collection_name)
+        exists = False
+
+    indexed = set()
+
+    if exists:
+        info = await qdrant_client.get_collection(collection_name)
+        existing = (spec.dense_size(info), collection_quantization(info))
+        requested = (dimensions or EMBEDDING_SIZE, quantization)
+
+        if existing != requested:
+            raise ValueError(
+                f"{collection_name} stores {existing[0]}-dim vectors with quantization={existing[1] or 'none'}, "
+                f"but {requested[0]}-dim with quantization={requested[1] or 'none'} was requested. "
+                f"Re-run with --recreate to rebuild it, or with --reindex to build a new generation."
+            )
+        indexed = set(info.payload_schema or {})
+    else:
+        logger.info(f"Creating collection {collection_name} (dimensions={dimensions or EMBEDDING_SIZE}, quantization={quantization or 'none'})")
+
+        await qdrant_client.create_collection(
+            collection_name=collection_name,
+            # With quantization the quantized vectors stay in RAM and the originals, used only for rescoring, go to disk
+            vectors_config=spec.vectors_config(dimensions or EMBEDDING_SIZE, on_disk=bool(quantization)),
+            sparse_vectors_config=spec.sparse_vectors_config(),
+            quantization_config=quantization_config(quantization)
+        )
+
+    for field_name in [name for name in spec.payload_indexes if name not in indexed]:
+        await qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=PayloadSchemaType.KEYWORD
+        )
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+async def previous_vectors(qdrant_client, collection_name: str, spec: DatasetSpec, batch: Batch, hashes: list, by_hash: bool = True) -> dict:
+    """Vectors already stored for the batch's texts, keyed by the content hash of their embedded text.
+
+    Points are matched on their indexed content_hash payload, so only points that can be reused are read.
+    Generations ingested before content_hash was stored (by_hash=False) are scanned by parent_asin and re-hashed.
+    """
+
+    if by_hash:
+        condition = FieldCondition(key="content_hash", match=MatchAny(any=list(set(hashes))))
+        fields = ["content_hash"]
+    else:
+        condition = FieldCondition(key="parent_asin", match=MatchAny(any=list({payload["parent_asin"] for payload in batch.payloads})))
+        fields = [spec.text_field]
+
+    vectors = {}
+    offset = None
+
+    while True:
+        points, offset = await qdrant_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=Filter(must=[condition]),
+            limit=256,
+            offset=offset,
+            with_payload=fields,
+            with_vectors=True
+        )
+
+        for point in points:
+            key = point.payload.get("content_hash") if by_hash else point.payload.get(spec.text_field)
+            if key is None:
+                continue
+            if not by_hash:
+                key = content_hash(key)
+            if spec.dense_vector_name:
+                vectors[key] = (point.vector.get(spec.dense_vector_name), point.vector.get(spec.sparse_vector_name))
+            else:
+                vectors[key] = (point.vector, None)
+
+        if offset is None:
+            return vectors
+
+
+def _build_points(spec: DatasetSpec, batch: Batch, hashes, dense_vectors, sparse_vectors):
+    points = []
+
+    for point_id, payload, text_hash, dense, sparse in zip(batch.ids, batch.payloads, hashes, dense_vectors, sparse_vectors):
+        if spec.dense_vector_name:
+            vector = {spec.dense_vector_name: dense}
+        else:
+            vector = dense
+
+        if spec.sparse_vector_name:
+            vector[spec.sparse_vector_name] = sparse
+
+        points.append(PointStruct(id=point_id, vector=vector, payload={**payload, "content_hash": text_hash}))
+
+    return points
+
+
+async def wait_for_pending_updates(qdrant_client, collection_name: str):
+    """Block until every update sent with wait=False has been applied.
+
+    Updates are applied in order, so a no-op delete with wait=True returns only after all earlier ones.
+    Point id 0 is never written (ids are line numbers starting at 1).
+    """
+
+    await qdrant_client.delete(
+        collection_name=collection_name,
+        points_selector=FilterSelector(filter=Filter(must=[HasIdCondition(has_id=[0])])),
+        wait=True
+    )
+
+
+async def mark_ingest_generation(qdrant_client, collection_name: str):
+    """Stamp the collection with a new generation id; readers that cache on its contents compare it."""
+
+    await qdrant_client.update_collection(
+        collection_name=collection_name,
+        metadata={"ingest_generation": uuid.uuid4().hex, "ingested_at": time.time()}
+    )
+
+
+async def ingest(
+    qdrant_client,
+    spec: DatasetSpec,
+    path: str,
+    collection_name: Optional[str] = None,
+    batch_size: int = 100,
+    concurrency: int = 4,
+    checkpoint_path: Optional[str] = None,
+    restart: bool = False,
+    keep_row=None,
+    previous_collection: Optional[str] = None,
+    checkpoint_extra: Optional[dict] = None,
+    dimensions: Optional[int] = None,
+    quantization: str = "",
+    recreate: bool = False,
+    clear_checkpoint: bool = True
+) -> dict:
+    """Stream a JSONL file into a Qdrant collection and return ingestion counters.
+
+    Batches are embedded and upserted by `concurrency` workers. The checkpoint only moves past a batch
+    once it and every batch before it were acknowledged, so a crashed run resumes without gaps.
+    With `previous_collection`, records whose text is unchanged there reuse its vectors instead of being re-embedded.
+    `dimensions` (default EMBEDDING_DIMENSIONS) truncates the embeddings; `quantization` applies to new collections.
+    An existing collection must match both, unless `recreate` deletes it and restarts from the beginning of the file.
+    The checkpoint is deleted once the run completes (unless `clear_checkpoint` is False), so the next run reads the
+    whole file again. A new ingest generation is stamped on the collection only if points were written.
+    """
+
+    collection_name = collection_name or spec.collection_name
+    dimensions = config.EMBEDDING_DIMENSIONS if dimensions is None else dimensions
+    checkpoint = Checkpoint(checkpoint_path or f"{path}.{collection_name}.checkpoint.json", checkpoint_extra)
+
+    if restart or recreate:
+        checkpoint.clear()
+    state = checkpoint.load()
+
+    if state["offset"]:
+        logger.info(f"Resuming {path} at byte {state['offset']} (next id {state['next_id']})")
+
+    token_counter = _token_counter()
+    sparse_encoder = _sparse_encoder() if spec.sparse_vector_name else None
+
+    await ensure_collection(qdrant_client, spec, collection_name, dimensions, quantization, recreate)
+
+    previous_by_hash = True
+    if previous_collection:
+        previous_info = await qdrant_client.get_collection(previous_collection)
+        previous_size = spec.dense_size(previous_info)
+        if previous_size != (dimensions or EMBEDDING_SIZE):
+            logger.info(f"{previous_collection} stores {previous_size}-dim vectors, re-embedding everything")
+            previous_collection = None
+        elif "content_hash" not in (previous_info.payload_schema or {}):
+            logger.info(f"{previous_collection} has no content_hash index, matching its points by parent_asin")
+            previous_by_hash = False
+
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    done = {}
+    failures = []
+    watermark = {"seq": 0}
+    stats = {"points": 0, "embedded": 0, "reused": 0, "batches": 0, "started_at": time.monotonic()}
+
+    def _advance_checkpoint():
+        while watermark["seq"] in done:
+            batch = done.pop(watermark["seq"])
+            checkpoint.save(batch.end_offset, batch.next_id)
+            watermark["seq"] += 1
+
+    async def _worker():
+        while True:
+            batch = await queue.get()
+            try:
+                if batch is None:
+                    return
+                # After a failure the remaining batches are drained unprocessed so the reader never blocks
+                if failures:
+                    continue
+
+                if batch.texts:
+                    hashes = [content_hash(text) for text in batch.texts]
+                    known = await previous_vectors(qdrant_client, previous_collection, spec, batch, hashes, previous_by_hash) if previous_collection else {}
+                    reused = [known.get(text_hash) for text_hash in hashes]
+
+                    dense_vectors = [vectors[0] if vectors else None for vectors in reused]
+                    sparse_vectors = [vectors[1] if vectors else None for vectors in reused]
+
+                    missing = [i for i, vectors in enumerate(reused) if vectors is None or (sparse_encoder and vectors[1] is None)]
+                    if missing:
+                        texts = [batch.texts[i] for i in missing]
+                        for i, embedding in zip(missing, await embed_with_backoff(texts, dimensions)):
+                            dense_vectors[i] = embedding
+
+                        if sparse_encoder is not None:
+                            sparse_embeddings = await asyncio.to_thread(lambda: list(sparse_encoder.embed(texts)))
+                            for i, sparse in zip(missing, sparse_embeddings):
+                                sparse_vectors[i] = models.SparseVector(indices=sparse.indices.tolist(), values=sparse.values.tolist())
+
+                    await qdrant_client.upsert(
+                        collection_name=collection_name,
+                        points=_build_points(spec, batch, hashes, dense_vectors, sparse_vectors),
+                        wait=False
+                    )
+
+                    stats["embedded"] += len(missing)
+                    stats["reused"] += len(batch.texts) - len(missing)
+
+                stats["points"] += len(batch.texts)
+                stats["batches"] += 1
+                done[batch.seq] = batch
+                _advance_checkpoint()
+
+                if stats["batches"] % 10 == 0:
+                    rate = stats["points"] / (time.monotonic() - stats["started_at"])
+                    logger.info(f"Ingested {stats['points']} points into {collection_name} ({rate:.0f} points/s)")
+            except Exception as e:
+                failures.append(e)
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(_worker()) for _ in range(concurrency)]
+
+    try:
+        batches = read_batches(path, spec, batch_size, state["offset"], state["next_id"], keep_row, token_counter)
+        for batch in batches:
+            if failures:
+                break
+            await queue.put(batch)
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+    if failures:
+        raise failures[0]
+
+    await wait_for_pending_updates(qdrant_client, collection_name)
+    if stats["points"]:
+        await mark_ingest_generation(qdrant_client, collection_name)
+    if clear_checkpoint:
+        checkpoint.clear()
+
+    stats["elapsed_s"] = time.monotonic() - stats.pop("started_at")
+    logger.info(f"Finished {path}: {stats['points']} points ({stats['embedded']} embedded, {stats['reused']} reused) in {stats['elapsed_s']:.1f}s")
+
+    return stats
+
+
+def parent_asins_from(path: str) -> set:
+    """Collect the parent_asin of every row of an items JSONL file, reading it line by line."""
+
+    parent_asins = set()
+
+    with open(path, "rb") as file:
+        for line in file:
+            if line.strip():
+                parent_asins.add(json.loads(line)["parent_asin"])
+
+    return parent_asins
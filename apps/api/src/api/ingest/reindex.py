@@ -0,0 +1,107 @@
+from typing import Optional
+import logging
+import time
+
+from qdrant_client.models import CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+
+from api.ingest.pipeline import Checkpoint, DatasetSpec, ingest
+
+
+logger = logging.getLogger(__name__)
+
+
+#### ALIASES ####
+async def resolve_alias(qdrant_client, alias: str) -> Optional[str]:
+    """Return the collection an alias points to, the name itself if it is a plain collection, or None."""
+
+    for description in (await qdrant_client.get_aliases()).aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+
+    if await qdrant_client.collection_exists(alias):
+        return alias
+
+    return None
+
+
+async def swap_alias(qdrant_client, alias: str, collection_name: str):
+    """Point an alias at a collection; readers switch over atomically."""
+
+    operations = []
+
+    current = await resolve_alias(qdrant_client, alias)
+    if current == alias:
+        # A plain collection holds the alias name; it has to go before the alias can exist (brief gap, one time only)
+        logger.warning(f"Deleting collection {alias} to replace it with an alias")
+        await qdrant_client.delete_collection(alias)
+    elif current is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=alias)))
+
+    await qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+
+    logger.info(f"Alias {alias} -> {collection_name} (was {current})")
+
+
+async def prune_collections(qdrant_client, alias: str, keep: set):
+    """Delete the alias' older generations, except the ones in `keep`."""
+
+    for description in (await qdrant_client.get_collections()).collections:
+        if description.name.startswith(f"{alias}-") and description.name not in keep:
+            logger.info(f"Deleting old collection {description.name}")
+            await qdrant_client.delete_collection(description.name)
+
+
+#### BLUE/GREEN RE-INDEX ####
+async def reindex(
+    qdrant_client,
+    spec: DatasetSpec,
+    path: str,
+    alias: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    restart: bool = False,
+    replace_collection: bool = False,
+    **ingest_kwargs
+) -> dict:
+    """Build a new generation of a collection from a JSONL file and switch the serving alias to it.
+
+    Records whose text is unchanged in the current generation (matched by parent_asin and content hash)
+    keep their vectors, so only new or edited descriptions and reviews are embedded. The previous
+    generation is kept for rollback; older ones are deleted.
+    """
+
+    alias = alias or spec.collection_name
+    checkpoint_path = checkpoint_path or f"{path}.{alias}.reindex.checkpoint.json"
+
+    if restart:
+        Checkpoint(checkpoint_path).clear()
+
+    previous = await resolve_alias(qdrant_client, alias)
+    if previous == alias and not replace_collection:
+        raise ValueError(
+            f"{alias} is a plain collection, not an alias. Re-run with --replace-collection to replace it "
+            f"with an alias once the new generation is built."
+        )
+
+    target = Checkpoint(checkpoint_path).load().get("collection") or f"{alias}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+    stats = await ingest(
+        qdrant_client,
+        spec,
+        path,
+        collection_name=target,
+        checkpoint_path=checkpoint_path,
+        previous_collection=previous if previous != target else None,
+        checkpoint_extra={"collection": target},
+        # Kept until the alias is switched, so a crash in between resumes into the same target
+        clear_checkpoint=False,
+        **ingest_kwargs
+    )
+
+    await swap_alias(qdrant_client, alias, target)
+    Checkpoint(checkpoint_path).clear()
+
+    await prune_collections(qdrant_client, alias, keep={target, previous})
+
+    return {**stats, "collection": target, "previous_collection": previous}
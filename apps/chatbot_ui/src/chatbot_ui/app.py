@@ -233,6 +233,7 @@ if prompt := st.chat_input("Hello! How can I assist you today?"):
 
         status_placeholder = st.empty()
         message_placeholder = st.empty()
+        streamed_answer = ""
 
         for line in api_call_stream(
             "post",
@@ -250,7 +251,12 @@ if prompt := st.chat_input("Hello! How can I assist you today?"):
                 try:
                     output = json.loads(data)
 
-                    if output["type"] == "final_answer":
+                    if output["type"] == "answer_delta":
+                        streamed_answer += output["data"]["delta"]
+                        status_placeholder.empty()
+                        message_placeholder.markdown(streamed_answer + "▌")
+
+                    elif output["type"] == "final_answer":
                         answer = output["data"]["answer"]
                         used_context = output["data"]["used_context"]
                         trace_id = output["data"]["trace_id"]
@@ -1,8 +1,7 @@
-from pydantic_settings import BaseSettings, SettingsConfigDict
+from retrieval_common.config import Config as RetrievalConfig
 
-class Config(BaseSettings):
-    OPENAI_API_KEY: str
-
-    model_config = SettingsConfigDict(env_file=".env")
+class Config(RetrievalConfig):
+    # Clients, retrieval, cache and server settings come from retrieval_common
+    QDRANT_ITEMS_COLLECTION: str = "Amazon-items-collection-01-hybrid-search-v2"
 
 config = Config()
\ No newline at end of file
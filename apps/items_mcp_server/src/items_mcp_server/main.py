@@ -1,10 +1,62 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import uvicorn
 from fastmcp import FastMCP
-from items_mcp_server.utils import retrieve_items_data, process_items_data
+from starlette.responses import JSONResponse
+from retrieval_common.clients import close_clients, get_async_openai_client, get_async_qdrant_client
+from retrieval_common.retrieval import embedding_cache_stats
+from retrieval_common.sparse import load_sparse_encoder, sparse_encoder_stats
+from items_mcp_server.core.config import config
+from items_mcp_server.utils import (
+    process_items_data,
+    qdrant_ready,
+    retrieve_items_data,
+    retrieve_items_data_batch
+)
+
+
+@asynccontextmanager
+async def lifespan(server):
+    # One pooled Qdrant and OpenAI client per worker process, shared by all tool calls
+    get_async_qdrant_client()
+    get_async_openai_client()
+    await asyncio.to_thread(load_sparse_encoder)
+    yield {}
+    await close_clients()
+
+
+mcp = FastMCP("items_mcp_server", lifespan=lifespan)
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request):
+    # Liveness: the worker is up and serving requests; also reports this worker's cache counters
+    misses = sparse_encoder_stats["misses"]
+    return JSONResponse({
+        "status": "ok",
+        "embedding_cache": embedding_cache_stats,
+        "sparse_encoder": {
+            **sparse_encoder_stats,
+            "mean_encode_ms": 1000 * sparse_encoder_stats["encode_seconds"] / misses if misses else 0.0
+        }
+    })
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready(request):
+    # Readiness: the worker can reach Qdrant. During a drain the listener is closed, so this stops answering.
+    try:
+        await asyncio.wait_for(qdrant_ready(), config.READINESS_TIMEOUT_SECONDS)
+    except Exception as e:
+        return JSONResponse({"status": "unavailable", "error": repr(e)}, status_code=503)
+
+    return JSONResponse({"status": "ready"})
 
-mcp = FastMCP("items_mcp_server")
 
 @mcp.tool
-def get_formatted_items_context(query: str, top_k: int =5) -> str:
+async def get_formatted_items_context(query: str, top_k: int =5) -> str:
 
     """
     Get the top k context, each representing an inventory item for a given query.
@@ -17,12 +69,68 @@ def get_formatted_items_context(query: str, top_k: int =5) -> str:
         A string of the top k context chunks with IDs and average ratings prepending to each chunk, each represending an inventory item a given query.
     """
 
-    context = retrieve_items_data(query, top_k)
+    context = await retrieve_items_data(query, top_k)
 
     formatted_context = process_items_data(context)
 
     return formatted_context
 
 
+@mcp.tool
+async def get_formatted_items_context_batch(queries: list[str], top_k: int =5) -> str:
+
+    """
+    Get the top k context for each of several queries in one call, each chunk representing an inventory item.
+
+    Args:
+        queries: The queries to get the context for.
+        top_k: The number of context chunks to retrieve per query, works best with 5 or more
+
+    Returns:
+        For each query, a "Query: <query>" line followed by its top k context chunks with IDs and average ratings prepending to each chunk.
+    """
+
+    contexts = await retrieve_items_data_batch(queries, top_k)
+
+    return "\n".join(f"Query: {query}\n{process_items_data(context)}" for query, context in zip(queries, contexts))
+
+
+@mcp.tool
+async def search_items(query: str, top_k: int =5) -> str:
+
+    """
+    Get the top k items for a query as unformatted chunks, for clients that rerank and format the context themselves.
+
+    Args:
+        query: The query to get the items for.
+        top_k: The number of items to retrieve.
+
+    Returns:
+        A JSON list of {"id", "text", "score", "rating"} objects, best match first.
+    """
+
+    context = await retrieve_items_data(query, top_k)
+
+    return json.dumps([
+        {"id": id, "text": chunk, "score": score, "rating": rating}
+        for id, chunk, score, rating in zip(
+            context['retrieved_context_ids'],
+            context['retrieved_context'],
+            context['similiarity_scores'],
+            context['retrieved_context_ratings']
+        )
+    ])
+
+
+# Stateless, so any worker can serve any request of a client's session; plain JSON responses instead of SSE
+app = mcp.http_app(stateless_http=True, json_response=True)
+
+
 if __name__ == "__main__":
-    mcp.run(transport="http", host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(
+        "items_mcp_server.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=config.SERVER_WORKERS,
+        timeout_graceful_shutdown=config.SERVER_GRACEFUL_SHUTDOWN_SECONDS
+    )
@@ -1,66 +1,79 @@
-import openai
-from qdrant_client import QdrantClient
-from qdrant_client.models import Prefetch, Document, FusionQuery
+import asyncio
+from qdrant_client.models import Prefetch, QueryRequest
+from retrieval_common.clients import get_async_qdrant_client
+from retrieval_common.retrieval import dense_search_params, fusion_query, get_embeddings, prefetch_limit
+from retrieval_common.sparse import encode_sparse_query
 
+from items_mcp_server.core.config import config
 
-def get_embeddings(text, model="text-embedding-3-small"):
-    response = openai.embeddings.create(
-        input=text,
-        model=model
-    )
-
-    return response.data[0].embedding
 
+async def qdrant_ready():
+    """Readiness: Qdrant answers and the collection (or alias) can be queried."""
 
-### Item Description Retrieval Tool
-def retrieve_items_data(query, k=5):
+    await get_async_qdrant_client().count(config.QDRANT_ITEMS_COLLECTION, exact=False)
 
-    query_embedding = get_embeddings(query)
 
-    qdrant_client = QdrantClient(url="http://qdrant:6333")
+### Item Description Retrieval Tool
+def items_query_request(query_embedding, sparse_vector, k):
 
-    results = qdrant_client.query_points(
-        collection_name="Amazon-items-collection-01-hybrid-search-v2",
+    return QueryRequest(
         prefetch=[
             Prefetch(
                 query=query_embedding,
                 using="text-embedding-3-small",
-                limit=20
+                params=dense_search_params(),
+                score_threshold=config.RETRIEVAL_DENSE_SCORE_THRESHOLD or None,
+                limit=prefetch_limit(k)
             ),
             Prefetch(
-                query=Document(text=query, model="Qdrant/bm25"),
+                query=sparse_vector,
                 using="bm25",
-                limit=20
+                score_threshold=config.RETRIEVAL_SPARSE_SCORE_THRESHOLD or None,
+                limit=prefetch_limit(k)
             )
         ],
-        query=FusionQuery(fusion="rrf"),
-        limit=k
+        query=fusion_query(),
+        limit=k,
+        with_payload=["parent_asin", "description", "average_rating"],
+        with_vector=False
     )
 
-    retrieved_context_ids = []
-    retrieved_context= []
-    similiarity_scores = []
-    retrieved_context_ratings = []
 
-    for result in results.points:
-        retrieved_context_ids.append(result.payload['parent_asin'])
-        retrieved_context.append(result.payload['description'])
-        similiarity_scores.append(result.score)
-        retrieved_context_ratings.append(result.payload['average_rating'])
+async def retrieve_items_data_batch(queries, k=5):
+    """Retrieve items for several queries with one embeddings request and one Qdrant batch query."""
 
-    return {
-        "retrieved_context_ids": retrieved_context_ids,
-        "retrieved_context": retrieved_context,
-        "similiarity_scores": similiarity_scores,
-        "retrieved_context_ratings": retrieved_context_ratings
-    }
+    # BM25 encoding is CPU work and may load the model; it runs in a thread, alongside the embeddings request
+    query_embeddings, sparse_vectors = await asyncio.gather(
+        get_embeddings(queries),
+        asyncio.to_thread(lambda: [encode_sparse_query(query) for query in queries])
+    )
 
+    responses = await get_async_qdrant_client().query_batch_points(
+        collection_name=config.QDRANT_ITEMS_COLLECTION,
+        requests=[items_query_request(embedding, sparse, k) for embedding, sparse in zip(query_embeddings, sparse_vectors)]
+    )
 
-def process_items_data(context):
+    contexts = []
 
-    formatted_context = ""
+    for response in responses:
+        contexts.append({
+            "retrieved_context_ids": [point.payload['parent_asin'] for point in response.points],
+            "retrieved_context": [point.payload['description'] for point in response.points],
+            "similiarity_scores": [point.score for point in response.points],
+            "retrieved_context_ratings": [point.payload['average_rating'] for point in response.points]
+        })
 
-    for id, chunk, rating in zip(context['retrieved_context_ids'], context['retrieved_context'], context['retrieved_context_ratings']):
-        formatted_context += f"- ID: {id}, Rating: {rating}, Description: {chunk}\n"
+    return contexts
 
-    return formatted_context
\ No newline at end of file
+
+async def retrieve_items_data(query, k=5):
+
+    return (await retrieve_items_data_batch([query], k))[0]
+
+
+def process_items_data(context):
+
+    return "".join(
+        f"- ID: {id}, Rating: {rating}, Description: {chunk}\n"
+        for id, chunk, rating in zip(context['retrieved_context_ids'], context['retrieved_context'], context['retrieved_context_ratings'])
+    )
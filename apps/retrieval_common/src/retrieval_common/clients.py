@@ -0,0 +1,39 @@
+import httpx
+from functools import lru_cache
+from openai import AsyncOpenAI
+from qdrant_client import AsyncQdrantClient
+
+from retrieval_common.config import config
+
+
+@lru_cache(maxsize=1)
+def get_async_qdrant_client():
+    return AsyncQdrantClient(
+        url=config.QDRANT_URL,
+        grpc_port=config.QDRANT_GRPC_PORT,
+        prefer_grpc=config.QDRANT_PREFER_GRPC,
+        timeout=config.QDRANT_TIMEOUT,
+        grpc_options={
+            "grpc.keepalive_time_ms": int(config.QDRANT_KEEPALIVE_EXPIRY * 1000),
+            "grpc.keepalive_permit_without_calls": 1,
+        },
+        limits=httpx.Limits(
+            max_connections=config.QDRANT_POOL_SIZE,
+            max_keepalive_connections=config.QDRANT_POOL_SIZE,
+            keepalive_expiry=config.QDRANT_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_async_openai_client():
+    return AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+
+
+async def close_clients():
+    if get_async_qdrant_client.cache_info().currsize:
+        await get_async_qdrant_client().close()
+        get_async_qdrant_client.cache_clear()
+    if get_async_openai_client.cache_info().currsize:
+        await get_async_openai_client().close()
+        get_async_openai_client.cache_clear()
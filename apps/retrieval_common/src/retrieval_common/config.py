@@ -0,0 +1,34 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Config(BaseSettings):
+    OPENAI_API_KEY: str
+
+    QDRANT_URL: str = "http://qdrant:6333"
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_TIMEOUT: int = 10
+    QDRANT_POOL_SIZE: int = 32
+    QDRANT_KEEPALIVE_EXPIRY: float = 60.0
+    QDRANT_QUANTIZATION_RESCORE: bool = True
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0
+
+    # Same knobs as the API's hybrid retriever
+    RETRIEVAL_FUSION: str = "rrf"  # "rrf", "dbsf" or "weighted"
+    RETRIEVAL_PREFETCH_FACTOR: float = 4.0
+    RETRIEVAL_PREFETCH_MIN: int = 20
+    RETRIEVAL_DENSE_SCORE_THRESHOLD: float = 0.0  # 0 = no threshold
+    RETRIEVAL_SPARSE_SCORE_THRESHOLD: float = 0.0
+    RETRIEVAL_DENSE_WEIGHT: float = 0.7  # "weighted" fusion only
+    RETRIEVAL_SPARSE_WEIGHT: float = 0.3
+
+    EMBEDDING_DIMENSIONS: int = 0  # must match the collection; 0 = full size
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10000
+    SPARSE_QUERY_CACHE_MAX_ENTRIES: int = 10000
+
+    SERVER_WORKERS: int = 1  # uvicorn worker processes, each with its own clients and caches
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30  # on SIGTERM, in-flight tool calls get this long to finish
+    READINESS_TIMEOUT_SECONDS: float = 2.0
+
+    model_config = SettingsConfigDict(env_file=".env")
+
+config = Config()
@@ -0,0 +1,80 @@
+import math
+import threading
+import unicodedata
+from collections import OrderedDict
+from qdrant_client import models
+from qdrant_client.models import Fusion, FusionQuery, QuantizationSearchParams, SearchParams
+
+from retrieval_common.clients import get_async_openai_client
+from retrieval_common.config import config
+
+
+def dense_search_params():
+    # Oversample and rescore with the original vectors when the collection is quantized
+    return SearchParams(
+        quantization=QuantizationSearchParams(
+            rescore=config.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=config.QDRANT_QUANTIZATION_OVERSAMPLING
+        )
+    )
+
+
+def prefetch_limit(k):
+    return max(config.RETRIEVAL_PREFETCH_MIN, math.ceil(k * config.RETRIEVAL_PREFETCH_FACTOR))
+
+
+def fusion_query():
+    if config.RETRIEVAL_FUSION == "rrf":
+        return FusionQuery(fusion=Fusion.RRF)
+    if config.RETRIEVAL_FUSION == "dbsf":
+        return FusionQuery(fusion=Fusion.DBSF)
+    if config.RETRIEVAL_FUSION == "weighted":
+        # $score[i] is the score from the i-th prefetch; points found by one branch only score 0 in the other
+        return models.FormulaQuery(
+            formula=models.SumExpression(sum=[
+                models.MultExpression(mult=[config.RETRIEVAL_DENSE_WEIGHT, "$score[0]"]),
+                models.MultExpression(mult=[config.RETRIEVAL_SPARSE_WEIGHT, "$score[1]"])
+            ]),
+            defaults={"$score[0]": 0.0, "$score[1]": 0.0}
+        )
+
+    raise ValueError(f"Unknown RETRIEVAL_FUSION: {config.RETRIEVAL_FUSION!r} (expected 'rrf', 'dbsf' or 'weighted')")
+
+
+_embedding_cache = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+embedding_cache_stats = {"hits": 0, "misses": 0}
+
+
+async def get_embeddings(texts, model="text-embedding-3-small"):
+    """Embeddings for a list of texts; the ones not in the LRU are fetched in a single request."""
+
+    keys = [(model, config.EMBEDDING_DIMENSIONS, " ".join(unicodedata.normalize("NFKC", text).casefold().split())) for text in texts]
+    embeddings = {}
+
+    with _embedding_cache_lock:
+        for key in keys:
+            if key in _embedding_cache:
+                _embedding_cache.move_to_end(key)
+                embeddings[key] = list(_embedding_cache[key])
+                embedding_cache_stats["hits"] += 1
+            else:
+                embedding_cache_stats["misses"] += 1
+
+    missing = {key: text for key, text in zip(keys, texts) if key not in embeddings}
+
+    if missing:
+        response = await get_async_openai_client().embeddings.create(
+            input=list(missing.values()),
+            model=model,
+            **({"dimensions": config.EMBEDDING_DIMENSIONS} if config.EMBEDDING_DIMENSIONS else {})
+        )
+
+        with _embedding_cache_lock:
+            for key, data in zip(missing, response.data):
+                embeddings[key] = data.embedding
+                _embedding_cache[key] = tuple(data.embedding)
+            while len(_embedding_cache) > config.EMBEDDING_CACHE_MAX_ENTRIES:
+                _embedding_cache.popitem(last=False)
+
+    return [embeddings[key] for key in keys]
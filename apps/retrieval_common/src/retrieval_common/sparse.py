@@ -0,0 +1,59 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from fastembed import SparseTextEmbedding
+from qdrant_client.models import SparseVector
+
+from retrieval_common.config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+_sparse_model = None
+_sparse_model_lock = threading.Lock()
+_sparse_cache = OrderedDict()
+_sparse_cache_lock = threading.Lock()
+sparse_encoder_stats = {"hits": 0, "misses": 0, "encode_seconds": 0.0, "load_seconds": None}
+
+
+def load_sparse_encoder():
+    """Load the BM25 query encoder; called at startup so the first query does not pay for it."""
+
+    global _sparse_model
+
+    with _sparse_model_lock:
+        if _sparse_model is None:
+            started = time.perf_counter()
+            _sparse_model = SparseTextEmbedding(model_name="Qdrant/bm25")
+            list(_sparse_model.query_embed("warm up"))
+            sparse_encoder_stats["load_seconds"] = time.perf_counter() - started
+            logger.info(f"Loaded sparse encoder Qdrant/bm25 in {sparse_encoder_stats['load_seconds']:.2f}s")
+
+    return _sparse_model
+
+
+def encode_sparse_query(query):
+    """BM25 query vector, from the LRU when the same query (up to case and spacing) was encoded before."""
+
+    key = " ".join(query.lower().split())
+
+    with _sparse_cache_lock:
+        if key in _sparse_cache:
+            _sparse_cache.move_to_end(key)
+            sparse_encoder_stats["hits"] += 1
+            return _sparse_cache[key]
+
+    started = time.perf_counter()
+    embedding = next(iter(load_sparse_encoder().query_embed(key)))
+    vector = SparseVector(indices=embedding.indices.tolist(), values=embedding.values.tolist())
+
+    with _sparse_cache_lock:
+        sparse_encoder_stats["misses"] += 1
+        sparse_encoder_stats["encode_seconds"] += time.perf_counter() - started
+        _sparse_cache[key] = vector
+        while len(_sparse_cache) > config.SPARSE_QUERY_CACHE_MAX_ENTRIES:
+            _sparse_cache.popitem(last=False)
+
+    return vector
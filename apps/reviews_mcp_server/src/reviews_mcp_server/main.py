@@ -1,10 +1,51 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import uvicorn
 from fastmcp import FastMCP
-from reviews_mcp_server.utils import retrieve_reviews_data, process_reviews_context
+from starlette.responses import JSONResponse
+from retrieval_common.clients import close_clients, get_async_openai_client, get_async_qdrant_client
+from reviews_mcp_server.core.config import config
+from reviews_mcp_server.utils import (
+    process_reviews_context,
+    qdrant_ready,
+    retrieve_reviews_data,
+    retrieve_reviews_data_batch
+)
+
+
+@asynccontextmanager
+async def lifespan(server):
+    # One pooled Qdrant and OpenAI client per worker process, shared by all tool calls
+    get_async_qdrant_client()
+    get_async_openai_client()
+    yield {}
+    await close_clients()
+
+
+mcp = FastMCP("reviews_mcp_server", lifespan=lifespan)
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request):
+    # Liveness: the worker is up and serving requests
+    return JSONResponse({"status": "ok"})
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready(request):
+    # Readiness: the worker can reach Qdrant. During a drain the listener is closed, so this stops answering.
+    try:
+        await asyncio.wait_for(qdrant_ready(), config.READINESS_TIMEOUT_SECONDS)
+    except Exception as e:
+        return JSONResponse({"status": "unavailable", "error": repr(e)}, status_code=503)
+
+    return JSONResponse({"status": "ready"})
 
-mcp = FastMCP("reviews_mcp_server")
 
 @mcp.tool
-def get_formatted_reviews_context(query: str, item_list: list, top_k: int =15) -> str:
+async def get_formatted_reviews_context(query: str, item_list: list, top_k: int =15) -> str:
 
     """
     Get the top k reviews mathcing a query for a list of prefiltered items.
@@ -18,12 +59,66 @@ def get_formatted_reviews_context(query: str, item_list: list, top_k: int =15) -
         A string of the top k reviews with IDs prepending to each review, each represending a review for a given query and item.
     """
 
-    context = retrieve_reviews_data(query, item_list, top_k)
+    context = await retrieve_reviews_data(query, item_list, top_k)
 
     formatted_context = process_reviews_context(context)
 
     return formatted_context
 
 
+@mcp.tool
+async def get_formatted_reviews_context_batch(queries: list[str], item_lists: list[list[str]], top_k: int =15) -> str:
+
+    """
+    Get the top k reviews for each of several queries in one call, each query with its own list of prefiltered items.
+
+    Args:
+        queries: The queries to get the reviews for.
+        item_lists: One list of items to prefilter the reviews for per query, in the same order as queries.
+        top_k: The number of reviews to retrieve per query, this should be at least 20 if multiple items are prefiltered.
+
+    Returns:
+        For each query, a "Query: <query>" line followed by its top k reviews with IDs prepending to each review.
+    """
+
+    contexts = await retrieve_reviews_data_batch(queries, item_lists, top_k)
+
+    return "\n".join(f"Query: {query}\n{process_reviews_context(context)}" for query, context in zip(queries, contexts))
+
+
+@mcp.tool
+async def search_reviews(query: str, item_list: list, top_k: int =15) -> str:
+
+    """
+    Get the top k reviews for a query and a list of prefiltered items as unformatted chunks, for clients that rerank
+    and format the context themselves.
+
+    Args:
+        query: The query to get the reviews for.
+        item_list: The list of items to prefilter the reviews for.
+        top_k: The number of reviews to retrieve.
+
+    Returns:
+        A JSON list of {"id", "text", "score"} objects, best match first; the id is the item's parent_asin.
+    """
+
+    context = await retrieve_reviews_data(query, item_list, top_k)
+
+    return json.dumps([
+        {"id": id, "text": chunk, "score": score}
+        for id, chunk, score in zip(context['retrieved_context_ids'], context['retrieved_context'], context['similiarity_scores'])
+    ])
+
+
+# Stateless, so any worker can serve any request of a client's session; plain JSON responses instead of SSE
+app = mcp.http_app(stateless_http=True, json_response=True)
+
+
 if __name__ == "__main__":
-    mcp.run(transport="http", host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(
+        "reviews_mcp_server.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=config.SERVER_WORKERS,
+        timeout_graceful_shutdown=config.SERVER_GRACEFUL_SHUTDOWN_SECONDS
+    )
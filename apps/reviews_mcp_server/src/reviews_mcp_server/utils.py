@@ -1,62 +1,70 @@
-import openai
-from qdrant_client import QdrantClient
-from qdrant_client.models import Prefetch, Document, FusionQuery, Filter, FieldCondition, MatchAny
+from qdrant_client.models import Filter, FieldCondition, MatchAny, QueryRequest
+from retrieval_common.clients import get_async_qdrant_client
+from retrieval_common.retrieval import dense_search_params, get_embeddings
 
+from reviews_mcp_server.core.config import config
 
-def get_embeddings(text, model="text-embedding-3-small"):
-    response = openai.embeddings.create(
-        input=text,
-        model=model
-    )
-
-    return response.data[0].embedding
 
+async def qdrant_ready():
+    """Readiness: Qdrant answers and the collection (or alias) can be queried."""
 
-def retrieve_reviews_data(query, item_list, k=5):
+    await get_async_qdrant_client().count(config.QDRANT_REVIEWS_COLLECTION, exact=False)
 
-    query_embedding = get_embeddings(query)
 
-    qdrant_client = QdrantClient(url="http://qdrant:6333")
+def reviews_query_request(query_embedding, item_list, k):
 
-    results = qdrant_client.query_points(
-        collection_name="Amazon-reviews-collection-01-reviews",
-        prefetch=Prefetch(
-            query=query_embedding,
-            filter=Filter(
-                must=[
-                    FieldCondition(
-                        key="parent_asin",
-                        match=MatchAny(any=item_list)
-                    )
-                ]
-            ),
-            limit=20
+    # Dense only, so query directly rather than fusing a single prefetch
+    return QueryRequest(
+        query=query_embedding,
+        filter=Filter(
+            must=[
+                FieldCondition(
+                    key="parent_asin",
+                    match=MatchAny(any=item_list)
+                )
+            ]
         ),
-        query=FusionQuery(fusion='rrf'),
-        limit=k
+        params=dense_search_params(),
+        score_threshold=config.RETRIEVAL_DENSE_SCORE_THRESHOLD or None,
+        limit=k,
+        with_payload=["parent_asin", "text"],
+        with_vector=False
     )
 
-    retrieved_context_ids = []
-    retrieved_context= []
-    similiarity_scores = []
 
-    for result in results.points:
-        retrieved_context_ids.append(result.payload['parent_asin'])
-        retrieved_context.append(result.payload['text'])
-        similiarity_scores.append(result.score)
+async def retrieve_reviews_data_batch(queries, item_lists, k=5):
+    """Retrieve reviews for several (query, item list) pairs with one embeddings request and one Qdrant batch query."""
 
-    return {
-        "retrieved_context_ids": retrieved_context_ids,
-        "retrieved_context": retrieved_context,
-        "similiarity_scores": similiarity_scores,
-    }
+    if len(queries) != len(item_lists):
+        raise ValueError(f"Got {len(queries)} queries but {len(item_lists)} item lists; pass one item list per query.")
 
+    query_embeddings = await get_embeddings(queries)
 
-def process_reviews_context(context):
+    responses = await get_async_qdrant_client().query_batch_points(
+        collection_name=config.QDRANT_REVIEWS_COLLECTION,
+        requests=[reviews_query_request(embedding, item_list, k) for embedding, item_list in zip(query_embeddings, item_lists)]
+    )
+
+    contexts = []
+
+    for response in responses:
+        contexts.append({
+            "retrieved_context_ids": [point.payload['parent_asin'] for point in response.points],
+            "retrieved_context": [point.payload['text'] for point in response.points],
+            "similiarity_scores": [point.score for point in response.points],
+        })
 
-    formatted_context = ""
+    return contexts
 
-    for id, chunk in zip(context['retrieved_context_ids'], context['retrieved_context']):
-        formatted_context += f"- ID: {id}, Review: {chunk}\n"
 
-    return formatted_context
\ No newline at end of file
+async def retrieve_reviews_data(query, item_list, k=5):
+
+    return (await retrieve_reviews_data_batch([query], [item_list], k))[0]
+
+
+def process_reviews_context(context):
+
+    return "".join(
+        f"- ID: {id}, Review: {chunk}\n"
+        for id, chunk in zip(context['retrieved_context_ids'], context['retrieved_context'])
+    )